@@ -2,23 +2,187 @@
 #This create a single endpoint /muster, which gets warhorn data for an entire event
 #posted to it, and returns the json version of the call to seat_table_gropus.
 
+#Game systems are loaded on the first muster, from the file named by the environmental
+#variable GAMESYSTEMPATH, or else the gamesystems.json beside mustard.py.
+
+#The time spent balancing tables can be capped, in seconds, with the environmental
+#variable MUSTARD_TIME_BUDGET or a time_budget field in the posted data.
+
+#Setting MUSTARD_BATCH_TABLES, or a batch_tables field in the posted data, balances
+#sessions of up to that many tables together in a single batch, which is much faster
+#for events made up of many small sessions.
+
+#Setting MUSTARD_CACHE_MB and/or MUSTARD_CACHE_DIR caches responses in memory, and
+#optionally on disk, keyed by the posted data, game systems, seed and RESULT_VERSION, so repeated
+#requests get the same response without mustering again. The seed comes from a seed
+#field in the posted data or MUSTARD_SEED, and otherwise from the cache key.
+#Cache statistics are available from /muster/cache.
+
+#Posting the tables of an earlier response in a previous field re-musters incrementally,
+#keeping the seating of sessions whose rosters have not changed.
+
+#Large musters can instead be posted to /muster/jobs, which queues them and returns a
+#job id straight away. /muster/jobs/<id> reports progress and /muster/jobs/<id>/result
+#returns the same JSON as /muster once the job is done. MUSTARD_JOB_WORKERS sets how
+#many jobs run at once, and MUSTARD_JOB_QUEUE how many may wait before new jobs are
+#refused. Posting data identical to a queued or running job returns that job. Finished
+#jobs are forgotten, oldest first, once there are more than 100 of them or their results
+#come to more than MUSTARD_JOB_RESULTS_MB megabytes, 256 by default.
+
+#Posting a compact field set to true writes each player once, in a players list, with
+#tables and waitlists holding indexes into it. Posting a format field set to ndjson
+#returns newline delimited JSON, with a line for each table and waitlist. musterjson.py
+#describes both. Only the default form can be posted back as previous.
+
+#/metrics reports, in the Prometheus text format, the time spent in each phase of
+#mustering and the solver's swap counts, totalled over every muster this process has
+#run. Posting a telemetry field set to true also adds the figures for that muster,
+#including each table group's solver statistics, to the response, which is then not
+#cached. These leave out the time spent writing the response itself.
+
+from os import environ
+from threading import Lock
 from flask import Flask, jsonify, request
 app = Flask(__name__)
 
-from mustard import init_game_data, seat_table_groups
-init_game_data('/var/www/mustard/gamesystems.json')
+from mustard import GAME_SYSTEMS, Telemetry, init_game_data, seat_table_groups, timed_phase
 
 from warhorn import warhorn2mustard
+from resultcache import ResultCache, canonical_key
+from jobs import JobQueue, QueueFull
+from musterjson import muster_dumps
+
+CACHE = None
+if environ.get('MUSTARD_CACHE_MB', None) or environ.get('MUSTARD_CACHE_DIR', None):
+	CACHE = ResultCache(max_bytes=int(float(environ.get('MUSTARD_CACHE_MB', 64)) * (1 << 20)),
+		directory=environ.get('MUSTARD_CACHE_DIR', None))
+
+METRICS = Telemetry(keep_groups=False)
+METRICS_LOCK = Lock()
+MUSTERS_RUN = 0
+
+#part of every cache key, so results cached on disk by an earlier version are not served
+#after an upgrade. Raise it whenever a change alters the response to the same request.
+RESULT_VERSION = 2
+
+GAME_DATA_LOCK = Lock()
+GAME_DATA_LOADED = False
+
+def load_game_data():
+	'''Load the game systems on the first muster rather than at import, from GAMESYSTEMPATH
+	or the gamesystems.json beside mustard.py.'''
+	global GAME_DATA_LOADED
+	with GAME_DATA_LOCK:
+		if GAME_DATA_LOADED: return
+		init_game_data()
+		GAME_DATA_LOADED = True
+
+def muster_options(warhorn_data):
+	'''The time budget, seed, batch size and content key for a posted muster. Asking for
+	telemetry does not change the key, so it does not change the seating either.'''
+	load_game_data()
+	time_budget = warhorn_data.get('time_budget', environ.get('MUSTARD_TIME_BUDGET', None))
+	if time_budget is not None: time_budget = float(time_budget)
+	seed = warhorn_data.get('seed', environ.get('MUSTARD_SEED', None))
+	if seed is not None: seed = int(seed)
+	batch_tables = warhorn_data.get('batch_tables', environ.get('MUSTARD_BATCH_TABLES', None))
+	if batch_tables is not None: batch_tables = int(batch_tables)
+	content = dict([(k, v) for (k, v) in warhorn_data.items() if k != 'telemetry'])
+	key = canonical_key(RESULT_VERSION, content, GAME_SYSTEMS, seed, time_budget, batch_tables)
+	return (time_budget, seed, batch_tables, key)
+
+def muster_mimetype(warhorn_data):
+	if warhorn_data.get('format', 'json') == 'ndjson': return 'application/x-ndjson'
+	return 'application/json'
+
+def muster_json(warhorn_data, progress=None):
+	'''Muster posted warhorn data, returning the JSON response body as bytes.'''
+	(time_budget, seed, batch_tables, key) = muster_options(warhorn_data)
+	report = bool(warhorn_data.get('telemetry', False))
+	use_cache = CACHE is not None and not report
+	if use_cache:
+		body = CACHE.get(key)
+		if body is not None: return body
+	if CACHE is not None and seed is None: seed = int(key[:16], 16)
+	telemetry = Telemetry(keep_groups=report)
+	with timed_phase(telemetry, 'parse'):
+		tgroups = warhorn2mustard(warhorn_data['slots'])
+	data = seat_table_groups(tgroups, time_budget=time_budget, seed=seed,
+		previous=warhorn_data.get('previous', None), progress=progress, telemetry=telemetry,
+		batch_tables=batch_tables)
+
+	compact = bool(warhorn_data.get('compact', False))
+	ndjson = warhorn_data.get('format', 'json') == 'ndjson'
+	#the telemetry in the response is taken before rendering, so leaves out the render phase
+	extra = {'telemetry' : telemetry.as_dict()} if report else None
+	with timed_phase(telemetry, 'render'):
+		body = muster_dumps(data, compact, ndjson, extra)
+	global MUSTERS_RUN
+	with METRICS_LOCK:
+		METRICS.merge(telemetry)
+		MUSTERS_RUN += 1
+	#results cut short by the time budget depend on machine load, so are not kept
+	if use_cache and not data['stopped_early']:
+		CACHE.put(key, body)
+	return body
+
+JOBS = JobQueue(muster_json, workers=int(environ.get('MUSTARD_JOB_WORKERS', 1)),
+	max_pending=int(environ.get('MUSTARD_JOB_QUEUE', 8)),
+	max_bytes=int(float(environ.get('MUSTARD_JOB_RESULTS_MB', 256)) * (1 << 20)))
 
 @app.route('/muster',methods=['POST'])
 def muster():
 	warhorn_data = request.json
-	tgroups = warhorn2mustard(warhorn_data['slots'])
-	data = seat_table_groups(tgroups)
-
-	return jsonify({
-		'tables' : [x.as_dict() for x in data['tables']],
-		'waitlists' : [x.as_dict() for x in data['waitlists']],
-		'locations_needed' : data['locations_needed'],
-		'messages' : data['messages']
-	})
+	return app.response_class(muster_json(warhorn_data), mimetype=muster_mimetype(warhorn_data))
+
+@app.route('/muster/jobs',methods=['POST'])
+def submit_job():
+	warhorn_data = request.json
+	key = muster_options(warhorn_data)[3]
+	if warhorn_data.get('telemetry', False): key += ':telemetry'
+	try:
+		(job, created) = JOBS.submit(key, warhorn_data)
+	except QueueFull as err:
+		return jsonify({'error' : str(err)}), 503, {'Retry-After' : '10'}
+	job.mimetype = muster_mimetype(warhorn_data)
+	return jsonify(job.status()), 202, {'Location' : '/muster/jobs/%s' % job.id}
+
+@app.route('/muster/jobs/<job_id>',methods=['GET'])
+def job_status(job_id):
+	job = JOBS.get(job_id)
+	if job is None: return jsonify({'error' : 'No such job.'}), 404
+	return jsonify(job.status())
+
+@app.route('/muster/jobs/<job_id>/result',methods=['GET'])
+def job_result(job_id):
+	job = JOBS.get(job_id)
+	if job is None: return jsonify({'error' : 'No such job.'}), 404
+	if job.state == 'failed': return jsonify(job.status()), 500
+	if job.state != 'done': return jsonify(job.status()), 202
+	return app.response_class(job.result, mimetype=job.mimetype)
+
+@app.route('/metrics',methods=['GET'])
+def metrics():
+	with METRICS_LOCK:
+		totals = METRICS.as_dict()
+		musters = MUSTERS_RUN
+	lines = [
+		'# HELP mustard_musters_total Musters run, not counting cached responses.',
+		'# TYPE mustard_musters_total counter',
+		'mustard_musters_total %d' % musters,
+		'# HELP mustard_phase_seconds_total Seconds spent in each phase of mustering.',
+		'# TYPE mustard_phase_seconds_total counter'
+	]
+	for (phase, seconds) in sorted(totals['phases'].items()):
+		lines.append('mustard_phase_seconds_total{phase="%s"} %f' % (phase, seconds))
+	for (name, field, desc) in [('mustard_solver_runs_total', 'solver_runs', 'Runs of the table solver.'),
+			('mustard_solver_attempts_total', 'attempts', 'Moves tried by the table solver.'),
+			('mustard_solver_accepts_total', 'accepts', 'Moves kept by the table solver.')]:
+		lines.append('# HELP %s %s' % (name, desc))
+		lines.append('# TYPE %s counter' % name)
+		lines.append('%s %d' % (name, totals[field]))
+	return app.response_class('\n'.join(lines) + '\n', mimetype='text/plain')
+
+@app.route('/muster/cache',methods=['GET'])
+def cache_stats():
+	return jsonify(CACHE.stats() if CACHE is not None else {})
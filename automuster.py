@@ -1,11 +1,12 @@
 #!/usr/bin/python3
 
-import json
-import sys
-from pprint import PrettyPrinter
-from warhorn import warhorn2mustard
+import argparse
+from collections import deque
+from os import environ
+from warhorn import warhorn2mustard, slots_by_venue
 from mustard import seat_table_groups, init_game_data
 from jinja2_helper import HTMLTemplateEngine
+from resultcache import canonical_key
 
 def description_for_table(table):
 	return {
@@ -25,39 +26,65 @@ def list_of_table_descriptions(tables):
 	return unique_tables
 
 class AutoMusterTemplateEngine(HTMLTemplateEngine):
-	def __init__(self):
-		HTMLTemplateEngine.__init__(self)
+	def __init__(self, cache_dir=None):
+		HTMLTemplateEngine.__init__(self, cache_dir=cache_dir)
 		self.template_env.filters['table_descs'] = list_of_table_descriptions
 
-def main():
+ENGINE = None
+
+def _init_worker(cache_dir):
+	'''Load the game systems and template once for each process rendering venues.'''
+	global ENGINE
 	init_game_data('gamesystems.json')
-	fin_name = sys.argv[1]
-	pp = PrettyPrinter()
-	output = AutoMusterTemplateEngine()
-
-	with open(fin_name, 'r', encoding='utf8') as fin:
-		top = json.load(fin)
-	slots = top['slots']
-	slots_by_venue = {}
-	for slot in slots:
-		venue = slot['venue']
-		vlist = slots_by_venue.get(venue,list())
-		vlist.append(slot)
-		slots_by_venue[venue] = vlist
-
-	for venue in slots_by_venue.keys():
-		tgroups = warhorn2mustard(slots_by_venue[venue])
-		games = [x for x in tgroups if not x.is_admin_signup()]
-		admin = [x for x in tgroups if x.is_admin_signup()]
-		data = seat_table_groups(games)
-		data['venue'] = venue
-		data['admin'] = admin 
-		fname = "Signup for %s.html" % venue
-		out = output.Render(data, 'signup')
-		with open(fname, "w") as fout:
-			fout.write(out)
-
-main()
+	ENGINE = AutoMusterTemplateEngine(cache_dir)
+
+def venue_seed(seed, venue):
+	'''Seed for mustering venue, which depends only on seed and the venue name, so the
+	seating does not depend on how many venues are mustered at once or in what order.'''
+	if seed is None: return None
+	return int(canonical_key(seed, venue)[:16], 16)
 
+def muster_venue(job):
+	'''Muster and render the signup sheet for one venue, where job is the venue, a list of
+	its slots and the seed to use. Returns the name of the file written.'''
+	(venue, slots, seed) = job
+	tgroups = warhorn2mustard(slots)
+	games = []
+	admin = []
+	for x in tgroups:
+		(admin if x.is_admin_signup() else games).append(x)
+	data = seat_table_groups(games, seed=venue_seed(seed, venue))
+	data['venue'] = venue
+	data['admin'] = admin
+	fname = "Signup for %s.html" % venue
+	with open(fname, "w") as fout:
+		ENGINE.Stream(data, 'signup', fout)
+	return fname
+
+def main():
+	parser = argparse.ArgumentParser(description='Muster exported Warhorn data into signup sheets.')
+	parser.add_argument('file', help='Warhorn export for the whole event, in json format')
+	parser.add_argument('--jobs', type=int, default=1, help='venues to muster at once, in separate processes')
+	parser.add_argument('--seed', type=int, help='seed for reproducible seating')
+	args = parser.parse_args()
+	cache_dir = environ.get('MUSTARD_TEMPLATE_CACHE', None)
 
+	with open(args.file, 'r', encoding='utf8') as fin:
+		if args.jobs <= 1:
+			_init_worker(cache_dir)
+			for (venue, slots) in slots_by_venue(fin):
+				muster_venue((venue, slots, args.seed))
+			return
+		#venues are read one at a time, so only a few more than are being mustered are
+		#held in memory waiting for a worker
+		from concurrent.futures import ProcessPoolExecutor
+		with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker,
+				initargs=(cache_dir,)) as pool:
+			pending = deque()
+			for (venue, slots) in slots_by_venue(fin):
+				if len(pending) >= 2 * args.jobs: pending.popleft().result()
+				pending.append(pool.submit(muster_venue, (venue, list(slots), args.seed)))
+			while pending: pending.popleft().result()
 
+if __name__ == '__main__':
+	main()
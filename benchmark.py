@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+
+#Times each phase of mustering synthetic events of several sizes: parsing the Warhorn
+#data, seating players with the TableSolver, assigning locations, building the daily
+#schedule and rendering signup sheets. The total solver score is recorded alongside the
+#times, so a change that speeds things up by seating players worse shows up as well.
+#Run it from the package directory.
+#
+#Usage: ./benchmark.py [--sizes 100,1000,10000] [--seed 0] [--repeat 3] [--batch 4]
+#                      [--output results.json] [--baseline results.json]
+#
+#--output saves the results as json, and --baseline compares against results saved
+#earlier, marking phases more than 25% slower and total scores that got worse (higher).
+#--batch seats sessions of up to that many tables with the BatchSolver.
+
+import argparse
+import json
+import platform
+from random import Random
+from time import perf_counter
+from mustard import init_game_data, batch_seat, collect_seating, LocationManager, daily_schedule
+from warhorn import warhorn2mustard
+from automuster import AutoMusterTemplateEngine
+from synthwarhorn import synthetic_event
+
+PHASES = ['parse', 'seat', 'locations', 'schedule', 'render']
+SLOWER = 1.25
+#differences smaller than this, in seconds, are timer noise rather than regressions
+NOISE = 0.002
+
+def run_once(event, seed, engine, batch_tables=None):
+	'''Muster event once, returning the time taken by each phase and the results.'''
+	times = {}
+	start = perf_counter()
+	tgroups = warhorn2mustard(event['slots'])
+	times['parse'] = perf_counter() - start
+
+	games = [x for x in tgroups if not x.is_admin_signup()]
+	admin = [x for x in tgroups if x.is_admin_signup()]
+	rnd = Random(seed)
+	seeds = [rnd.getrandbits(64) for g in games]
+	start = perf_counter()
+	if batch_tables: batch_seat(games, seeds, rng=Random(rnd.getrandbits(64)), max_tables=batch_tables)
+	tables = []
+	waitlists = []
+	messages = []
+	for (g, group_seed) in zip(games, seeds):
+		collect_seating(g.seat_players(None, Random(group_seed)), tables, waitlists, messages)
+	times['seat'] = perf_counter() - start
+	messages = [m[0] for m in messages]
+
+	start = perf_counter()
+	lm = LocationManager(tables)
+	lm.set_locations()
+	times['locations'] = perf_counter() - start
+
+	start = perf_counter()
+	schedule = daily_schedule(tables + waitlists)
+	times['schedule'] = perf_counter() - start
+
+	data = {
+		'tables' : tables,
+		'waitlists' : waitlists,
+		'messages' : messages,
+		'schedule' : schedule,
+		'locations_needed' : lm.used,
+		'venue' : 'Benchmark',
+		'admin' : admin
+	}
+	start = perf_counter()
+	html = engine.Render(data, 'signup')
+	times['render'] = perf_counter() - start
+
+	return (times, {
+		'groups' : len(games),
+		'tables' : len(tables),
+		'score' : sum([g.score for g in games if g.score is not None]),
+		'locations_needed' : lm.used,
+		'html_bytes' : len(html)
+	})
+
+def benchmark(signups, seed, repeat, engine, batch_tables=None):
+	'''Best time for each phase over repeat runs, on a synthetic event of about signups
+	signups. Seating is seeded, so every run gives the same score.'''
+	event = synthetic_event(signups, seed)
+	best = None
+	for i in range(0, repeat):
+		(times, result) = run_once(event, seed, engine, batch_tables)
+		if best is None: best = times
+		else: best = dict([(k, min(best[k], times[k])) for k in PHASES])
+	result['signups'] = signups
+	result['times'] = best
+	return result
+
+def report(results, baseline):
+	old = {}
+	if baseline:
+		for r in baseline['results']:
+			old[r['signups']] = r
+	print('%8s %7s %7s' % ('signups', 'groups', 'tables') +
+		''.join([' %11s' % x for x in PHASES]) + ' %11s %9s' % ('score', 'locations'))
+	for r in results:
+		prev = old.get(r['signups'], None)
+		line = '%8d %7d %7d' % (r['signups'], r['groups'], r['tables'])
+		for phase in PHASES:
+			t = r['times'][phase]
+			mark = '*' if prev and t > max(prev['times'][phase] * SLOWER, prev['times'][phase] + NOISE) else ''
+			line += ' %11s' % ('%.3fs%s' % (t, mark))
+		mark = '*' if prev and r['score'] > prev['score'] + 1e-6 else ''
+		line += ' %11s %9d' % ('%.2f%s' % (r['score'], mark), r['locations_needed'])
+		print(line)
+		if prev:
+			line = '%8s %7s %7s' % ('vs base', '', '')
+			for phase in PHASES:
+				line += ' %10.2fx' % (r['times'][phase] / max(prev['times'][phase], 1e-9))
+			line += ' %+11.2f %+9d' % (r['score'] - prev['score'], r['locations_needed'] - prev['locations_needed'])
+			print(line)
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmark mustering synthetic Warhorn events.')
+	parser.add_argument('--sizes', default='100,1000,10000', help='comma separated numbers of signups')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--repeat', type=int, default=3, help='runs per size, keeping the best times')
+	parser.add_argument('--batch', type=int, help='batch sessions of up to this many tables')
+	parser.add_argument('--output', help='file to save results to, as json')
+	parser.add_argument('--baseline', help='results saved earlier to compare against')
+	args = parser.parse_args()
+
+	init_game_data('gamesystems.json')
+	engine = AutoMusterTemplateEngine()
+	baseline = None
+	if args.baseline:
+		with open(args.baseline, 'r', encoding='utf8') as fin:
+			baseline = json.load(fin)
+	results = [benchmark(int(x), args.seed, args.repeat, engine, args.batch) for x in args.sizes.split(',')]
+	report(results, baseline)
+	if args.output:
+		with open(args.output, 'w', encoding='utf8') as fout:
+			json.dump({
+				'seed' : args.seed,
+				'batch' : args.batch,
+				'python' : platform.python_version(),
+				'machine' : platform.machine(),
+				'results' : results
+			}, fout, indent='\t')
+
+if __name__ == '__main__':
+	main()
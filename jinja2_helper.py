@@ -1,5 +1,4 @@
 import os
-import jinja2
 
 CURRENT_ENGINE = None
 
@@ -16,33 +15,61 @@ def as_set(obj):
 class TemplateEngine:
 	'''Simple helper for jinja2 templates. Looks for templates in X.template.extension" 
 	files, where .extension is usually set by the subclass. Impleases the |usetemplate
-	filter, allowing for a template to call another template.'''
+	filter, allowing for a template to call another template.
 
-	def __init__(self, ext, path):
+	Templates are compiled once per engine and kept. If cache_dir is given, compiled
+	templates are also saved there as bytecode, so later runs skip compiling them.
+	jinja2 is only imported once an engine is made.'''
+
+	def __init__(self, ext, path, cache_dir=None):
+		import jinja2
 		self.path = path
-		self.template_env = jinja2.Environment(loader=jinja2.FileSystemLoader(path))
-		self.template_env.filters['usetemplate'] = use_template
+		bytecode_cache = None
+		if cache_dir is not None:
+			os.makedirs(cache_dir, exist_ok=True)
+			bytecode_cache = jinja2.FileSystemBytecodeCache(cache_dir)
+		self.template_env = jinja2.Environment(loader=jinja2.FileSystemLoader(path),
+			bytecode_cache=bytecode_cache, auto_reload=False)
+		#sub-templates render through this engine, rather than whichever engine was used last
+		self.template_env.filters['usetemplate'] = self.Render
 		self.template_env.filters['as_set'] = as_set
 		self.extension = ext
-			
-	def Render(self, obj, template):
-		global CURRENT_ENGINE
-		CURRENT_ENGINE = self
+		self.templates = {}
+
+	def Template(self, template):
+		'''The compiled jinja2 template named template.'''
+		import jinja2
 		tname = "%s.template.%s" % (template, self.extension)
+		compiled = self.templates.get(tname, None)
+		if compiled is not None: return compiled
 		try:
-			template = self.template_env.get_template(tname)
-		except jinja2.UndefinedError as err:
-			raise Exception('Template \"{0}\" not found at path {2}'.format(
-				tname, self.extention, self.path))
+			compiled = self.template_env.get_template(tname)
+		except jinja2.TemplateNotFound:
+			raise Exception('Template \"{0}\" not found at path {1}'.format(
+				tname, self.path))
 		except jinja2.TemplateSyntaxError as err:
 			line1 = 'Syntax error in on line {0} of template \"{1}\" at path {2}.'.format(
 				err.lineno,tname, self.path)
 			raise Exception(line1 + '\n\t' + err.message)
-		return template.render(obj)
+		self.templates[tname] = compiled
+		return compiled
+
+	def Render(self, obj, template):
+		global CURRENT_ENGINE
+		CURRENT_ENGINE = self
+		return self.Template(template).render(obj)
+
+	def Stream(self, obj, template, fout):
+		'''Render template straight into the open file fout, a piece at a time, rather
+		than building the whole output as one string first.'''
+		global CURRENT_ENGINE
+		CURRENT_ENGINE = self
+		for chunk in self.Template(template).generate(obj):
+			fout.write(chunk)
 	
 class HTMLTemplateEngine (TemplateEngine):
-	def __init__(self, path='.'):
-		TemplateEngine.__init__(self, 'html', path)
+	def __init__(self, path='.', cache_dir=None):
+		TemplateEngine.__init__(self, 'html', path, cache_dir)
 	
 	
 
@@ -0,0 +1,90 @@
+#Local job queue for long running musters. Jobs run on a bounded pool of worker threads
+#in this process, so no outside broker is needed. Identical jobs already queued or
+#running are shared rather than run twice, and submissions are refused once too many
+#jobs are waiting.
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from uuid import uuid4
+
+class QueueFull(RuntimeError):
+	pass
+
+class Job:
+	def __init__(self, key):
+		self.id = uuid4().hex
+		self.key = key
+		self.state = 'queued'
+		self.done = 0
+		self.total = None
+		self.result = None
+		self.error = None
+
+	def progress(self, done, total):
+		self.done = done
+		self.total = total
+
+	def status(self):
+		return {
+			'id' : self.id,
+			'state' : self.state,
+			'groups_seated' : self.done,
+			'groups_total' : self.total,
+			'error' : self.error
+		}
+
+class JobQueue:
+	'''Run jobs through run(payload, progress), which returns the job's result and may
+	call progress(done, total) as it goes. At most workers jobs run at once, and at most
+	max_pending more may wait. The last keep finished jobs are remembered, as long as
+	their results come to no more than max_bytes between them.'''
+	def __init__(self, run, workers=1, max_pending=8, keep=100, max_bytes=256 << 20):
+		self.run = run
+		self.max_pending = max_pending
+		self.keep = keep
+		self.max_bytes = max_bytes
+		self.pool = ThreadPoolExecutor(max_workers=workers)
+		self.lock = Lock()
+		self.jobs = OrderedDict()
+		self.active = {}
+
+	def submit(self, key, payload):
+		'''Queue a job, returning it and whether it is new. A job with the same key that
+		is still queued or running is returned instead of queueing another.'''
+		with self.lock:
+			job = self.active.get(key, None)
+			if job is not None: return (job, False)
+			pending = len([x for x in self.active.values() if x.state == 'queued'])
+			if pending >= self.max_pending:
+				raise QueueFull('Too many muster jobs waiting.')
+			job = Job(key)
+			self.active[key] = job
+			self.jobs[job.id] = job
+			self._forget()
+		self.pool.submit(self._work, job, payload)
+		return (job, True)
+
+	def get(self, job_id):
+		with self.lock:
+			return self.jobs.get(job_id, None)
+
+	def _forget(self):
+		finished = [x for x in self.jobs.values() if x.state in ('done', 'failed')]
+		held = sum([len(x.result or b'') for x in finished])
+		for (i, job) in enumerate(finished):
+			if len(finished) - i <= self.keep and held <= self.max_bytes: break
+			held -= len(job.result or b'')
+			del self.jobs[job.id]
+
+	def _work(self, job, payload):
+		job.state = 'running'
+		try:
+			job.result = self.run(payload, job.progress)
+			job.state = 'done'
+		except Exception as err:
+			job.error = str(err)
+			job.state = 'failed'
+		with self.lock:
+			del self.active[job.key]
+			self._forget()
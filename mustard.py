@@ -1,63 +1,161 @@
 from copy import copy, deepcopy
-from functools import reduce
 import json
+import os
 from os import environ
-import numpy as np 
-from random import randrange, seed
+from importlib import import_module
+from threading import Lock
+from types import MappingProxyType
+from random import Random
+from math import exp, log
+from bisect import bisect_left, insort
+from heapq import heappop, heappush
+from itertools import groupby
+from collections import Counter, deque
+from time import monotonic, perf_counter
+from contextlib import contextmanager, nullcontext
 
 GAME_SYSTEMS = {}
 
+class _LazyModule:
+	'''Stands in for a module until one of its attributes is first used, then imports
+	the module and replaces itself with it as a global of this module, so importing
+	mustard is quick for callers that never seat a table.'''
+	lock = Lock()
+
+	def __init__(self, name, alias):
+		self.name = name
+		self.alias = alias
+
+	def __getattr__(self, attr):
+		with _LazyModule.lock:
+			module = import_module(self.name)
+			globals()[self.alias] = module
+		return getattr(module, attr)
+
+np = _LazyModule('numpy', 'np')
+
 def group_by(lst, grouping=lambda x:x, sorting=lambda x:x, rev=False):
-	'''Group a list into a list of sublists accordding to a grouping function.'''
+	'''Group a list into a list of sublists accordding to a grouping function, in a single
+	pass over a dictionary of groups. Items with a false grouping value each get a group of
+	their own. Groups are then ordered by the sorting function of their first item, so it
+	should give the same value for every item in a group, or left in order of their first
+	item if sorting is None. Items keep their order within a group.'''
 	groups = []
-	_lst = sorted(lst,key=sorting,reverse=rev)
-	gval = grouping(_lst[0])
-	nxtgp = [_lst[0]]
-	for item in _lst[1:]:
-		ngv = grouping(item)
-		if not ngv or gval != ngv:
-			groups.append(nxtgp)
-			nxtgp = [item]
-			gval = ngv
-		else:
-			nxtgp.append(item)
-	groups.append(nxtgp)
+	by_key = {}
+	for item in lst:
+		key = grouping(item)
+		if not key:
+			groups.append([item])
+			continue
+		group = by_key.get(key, None)
+		if group is None:
+			group = by_key[key] = []
+			groups.append(group)
+		group.append(item)
+	if sorting is not None:
+		groups.sort(key=lambda x:sorting(x[0]), reverse=rev)
 	return groups
 
+class UnknownGameSystem(RuntimeError):
+	def __init__(self, names):
+		self.names = sorted(names)
+		RuntimeError.__init__(self, 'Game system%s %s not defined.' % (
+			's' if len(self.names) > 1 else '', ', '.join(self.names)))
+
 class GameSystem:
+	'''A game system definition, compiled into a role name to row index map and a dense
+	role matrix. Instances are shared between TableGroups, so they are read only; use
+	game_system() to get one.'''
 	def __init__(self, gsystem):
 		if gsystem not in GAME_SYSTEMS:
-			raise RuntimeError('Game system %s not defined.' % gsystem)
+			raise UnknownGameSystem([gsystem])
 		definition = GAME_SYSTEMS[gsystem]
+		#names are for display and need not be unique, so the registry key identifies the system
+		self.key = gsystem
 		self.name = definition['name']
 		self.min_players = definition['min_players']
 		self.max_players = definition['max_players']
 		self.refname = definition['refname']
-		self.roles = {}
+		roles = {}
 		for r in definition['roles'].keys() :
-			self.roles[r] = np.array(definition['roles'][r])
+			roles[r] = np.array(definition['roles'][r])
+			roles[r].flags.writeable = False
+		self.roles = MappingProxyType(roles)
 		self.num_roles = 0
 		for k in self.roles.keys():
 			if len(self.roles[k]) > self.num_roles:
 				self.num_roles = len(self.roles[k])
+		role_index = {}
+		self.role_matrix = np.zeros((len(self.roles), self.num_roles))
+		for r in self.roles.keys():
+			role_index[r] = len(role_index)
+			self.role_matrix[role_index[r], :len(self.roles[r])] = self.roles[r]
+		self.role_matrix.flags.writeable = False
+		self.role_index = MappingProxyType(role_index)
+
+	def __getstate__(self):
+		state = dict(self.__dict__)
+		state['roles'] = dict(self.roles)
+		state['role_index'] = dict(self.role_index)
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		for r in self.roles.values():
+			r.flags.writeable = False
+		self.role_matrix.flags.writeable = False
+		self.roles = MappingProxyType(self.roles)
+		self.role_index = MappingProxyType(self.role_index)
+
+_GAME_SYSTEM_CACHE = {}
 
-def init_game_data(gpath):
+def game_system(gsystem):
+	'''The shared GameSystem for a name, compiled on first use.'''
+	if not gsystem: gsystem = 'Default'
+	gsys = _GAME_SYSTEM_CACHE.get(gsystem, None)
+	if gsys is None:
+		gsys = GameSystem(gsystem)
+		_GAME_SYSTEM_CACHE[gsystem] = gsys
+	return gsys
+
+def check_game_systems(names):
+	'''Raise UnknownGameSystem naming every undefined system in names. None stands for
+	the Default system.'''
+	unknown = set([x for x in names if x and x not in GAME_SYSTEMS])
+	if unknown: raise UnknownGameSystem(unknown)
+
+def game_data_path(gpath=None):
+	'''Where to load game system definitions from: the environmental variable
+	GAMESYSTEMPATH if set, otherwise gpath, otherwise gamesystems.json. A relative path
+	missing from the working directory is looked for next to this module.'''
+	gpath = environ.get('GAMESYSTEMPATH', None) or gpath or 'gamesystems.json'
+	if not os.path.isabs(gpath) and not os.path.exists(gpath):
+		beside = os.path.join(os.path.dirname(os.path.abspath(__file__)), gpath)
+		if os.path.exists(beside): return beside
+	return gpath
+
+def init_game_data(gpath=None):
 	global GAME_SYSTEMS
-	if not gpath: gpath = 'gamesystems.json'
+	gpath = game_data_path(gpath)
 	try:
-		with open('gamesystems.json', 'r', encoding='utf8') as fin:
+		with open(gpath, 'r', encoding='utf8') as fin:
 			gtmp = json.load(fin)
 			GAME_SYSTEMS.update(gtmp)
+			_GAME_SYSTEM_CACHE.clear()
 	except:
-		msg = 'Failed to load game system definitions from %s.' % gpath
+		msg = 'Failed to load game system definitions from %s. ' % gpath
 		msg = msg + 'You can control where this file is loaded from by setting environmental variable GAMESYSTEMPATH.'
 		raise RuntimeError(msg)
-	seed()
 
 class TableAssignment:
+	#'__dict__' leaves room for any extra fields callers attach, and is only allocated if they do.
+	__slots__ = ('gm', 'players', 'seats', 'refname', 'start_time', 'end_time', 'pass_through',
+		'id', 'sub_id', 'event', 'location', '__dict__')
+
 	def __init__(self):
 		self.gm = None
 		self.players = []
+		self.location = None
 		self.seats = 0
 		self.refname = "Game Master"
 		self.start_time = None
@@ -76,10 +174,14 @@ class TableAssignment:
 			'id' : self.id,
 			'sub_id' : self.sub_id,
 			'seats' : self.seats,
-			'refname' : self.refname
+			'refname' : self.refname,
+			'location' : self.location
 		}
 
 class WaitList:
+	__slots__ = ('players', 'start_time', 'end_time', 'pass_through', 'id', 'sub_id', 'event',
+		'__dict__')
+
 	def __init__(self, w):
 		self.players = w
 		self.start_time = None
@@ -97,13 +199,13 @@ class WaitList:
 		}
 
 class Player:
+    __slots__ = ('name', 'team', '_roles', 'id', '__dict__')
+
     def __init__(self):
         self.name = None
         self.team = None
         self._roles = []
-        self._level = 0
         self.id = None
-        self._rolev = None
 
     def as_dict(self):
     	return {
@@ -115,6 +217,126 @@ class Player:
     def add_role(self, role,lvl = 9):
     	self._roles.append((role,lvl))
 
+class PlayerTable:
+	'''Columnar form of a list of players for one game system: names, team ids (indexes
+	into teams, -1 for no team), signup times as POSIX timestamps (NaN if unknown), and
+	each player's role vector and total level as rows of rolev and levels.'''
+	def __init__(self, num_players, num_roles):
+		self.names = [None] * num_players
+		self.teams = []
+		self.team_ids = np.full(num_players, -1, dtype=np.int32)
+		self.signup_at = np.full(num_players, np.nan)
+		self.rolev = np.zeros((num_players, num_roles))
+		self.levels = np.zeros(num_players)
+
+	def __len__(self):
+		return len(self.names)
+
+	@classmethod
+	def from_players(cls, players, game_system):
+		'''Build a PlayerTable from Player objects. Leveled roles are weighted by level
+		and averaged into a single block, which is then averaged with any unleveled roles.'''
+		num = len(players)
+		table = cls(num, game_system.num_roles)
+		team_index = {}
+		weights = np.zeros((num, len(game_system.role_index)))
+		unleveled = np.zeros((num, len(game_system.role_index)))
+		for i in range(0, num):
+			p = players[i]
+			table.names[i] = p.name
+			if p.team:
+				team = p.team.lower()
+				if team not in team_index:
+					team_index[team] = len(table.teams)
+					table.teams.append(team)
+				table.team_ids[i] = team_index[team]
+			signup_at = getattr(p, 'signup_at', None)
+			if signup_at: table.signup_at[i] = signup_at.timestamp()
+			for r in p._roles:
+				if r[1]: table.levels[i] += r[1]
+				if not r[0]: continue
+				col = game_system.role_index.get(r[0].lower(), None)
+				if col is None: continue
+				if r[1]: weights[i, col] += r[1]
+				else: unleveled[i, col] += 1
+		lvls = weights.sum(axis=1)
+		leveled = lvls > 0
+		accum = weights @ game_system.role_matrix
+		accum[leveled] /= lvls[leveled, None]
+		accum += unleveled @ game_system.role_matrix
+		blocks = leveled + unleveled.sum(axis=1)
+		has_blocks = blocks > 0
+		accum[has_blocks] /= blocks[has_blocks, None]
+		table.rolev = np.ascontiguousarray(accum)
+		return table
+
+class Telemetry:
+	'''Timings and solver statistics for a muster. Pass one to seat_table_groups, or to a
+	TableSolver, and read it afterwards. phases holds the seconds spent in each phase,
+	summed over all TableGroups, and groups a record for each run of the TableSolver,
+	with its swap attempts and accepts, the iteration it last improved on and the final
+	score of each table. Records are only kept if keep_groups is set.'''
+	def __init__(self, keep_groups=True):
+		self.phases = {}
+		self.groups = []
+		self.keep_groups = keep_groups
+		self.solver_runs = 0
+		self.attempts = 0
+		self.accepts = 0
+
+	@contextmanager
+	def phase(self, name):
+		start = perf_counter()
+		try:
+			yield
+		finally:
+			self.phases[name] = self.phases.get(name, 0.0) + perf_counter() - start
+
+	def solver_run(self, solver):
+		tg = solver.table_group
+		self.solver_runs += 1
+		self.attempts += solver.attempts
+		self.accepts += solver.accepts
+		if not self.keep_groups: return
+		self.groups.append({
+			'id' : tg.id,
+			'event' : tg.event,
+			'strategy' : type(solver.strategy).__name__,
+			'players' : solver.to_seat,
+			'tables' : solver.need_tables,
+			'units' : len(solver.seating),
+			'score' : solver.score,
+			'table_scores' : [solver.score_table(i) for i in range(0, solver.need_tables)],
+			'attempts' : solver.attempts,
+			'accepts' : solver.accepts,
+			'iterations' : solver.iterations,
+			'converged_at' : solver.converged_at,
+			'stopped_early' : solver.stopped_early
+		})
+
+	def merge(self, other):
+		'''Add the figures of another Telemetry, such as one from a worker process.'''
+		for (name, seconds) in other.phases.items():
+			self.phases[name] = self.phases.get(name, 0.0) + seconds
+		self.solver_runs += other.solver_runs
+		self.attempts += other.attempts
+		self.accepts += other.accepts
+		if self.keep_groups: self.groups.extend(other.groups)
+
+	def as_dict(self):
+		return {
+			'phases' : dict(self.phases),
+			'solver_runs' : self.solver_runs,
+			'attempts' : self.attempts,
+			'accepts' : self.accepts,
+			'groups' : list(self.groups)
+		}
+
+def timed_phase(telemetry, name):
+	'''Context timing a phase in telemetry, doing nothing when telemetry is None.'''
+	if telemetry is None: return nullcontext()
+	return telemetry.phase(name)
+
 class TableGroup:
 	"""TableGroup objects are typically created and initalized by a front end driver,
 	reading from some data source such as a warhorn import."""
@@ -128,8 +350,19 @@ class TableGroup:
 		self.end_time = None
 		self.pass_through = {}
 		self.id = None
-		if gsystem: self._game_system = GameSystem(gsystem)
-		else: self._game_system = GameSystem('Default')
+		self.solver = None
+		self.score = None
+		self.time_budget = None
+		self.stopped_early = False
+		self.restarts = 1
+		self.restart_workers = None
+		self.player_table = None
+		self.previous_tables = None
+		self.warm_start = None
+		self.reused = False
+		self.presolved = None
+		self.seating_indexes = None
+		self._game_system = game_system(gsystem)
 
 	def _TableAssignment(self):
 		ta = TableAssignment()
@@ -152,6 +385,92 @@ class TableGroup:
 		w.sub_id = sub_id
 		return w
 
+	def previous_seating(self, plist, num_tables):
+		'''If the previous muster seated exactly these players at the tables of these game
+		masters, with none over the table size, return its seating. Otherwise keep it as a warm start for the solver.'''
+		self.warm_start = None
+		self.reused = False
+		confirmed = [r for r in self.previous_tables or [] if r['gm'] is not None]
+		if not confirmed: return None
+		#players sharing a key, such as two of the same name without ids, are matched in order
+		by_key = {}
+		for p in plist:
+			by_key.setdefault(player_key(p), deque()).append(p)
+		seated = Counter([k for r in confirmed for k in r['players']])
+		if (len(confirmed) == num_tables and seated == Counter([player_key(p) for p in plist])
+				and max([len(r['players']) for r in confirmed]) <= self.seats_per_table
+				and [r['gm'] for r in confirmed] == [player_key(g) for g in self.gmlist[:num_tables]]):
+			self.reused = True
+			return [[by_key[k].popleft() for k in r['players']] for r in confirmed]
+		self.warm_start = [r['players'] for r in confirmed]
+		return None
+
+	def solve(self, deadline, rng, telemetry=None):
+		'''Balance the confirmed tables, keeping the best of restarts independent runs
+		of the TableSolver. Restarts run in restart_workers processes when that is set.'''
+		if self.presolved is not None:
+			(self.score, self.stopped_early, seating, unused) = self.presolved
+			self.presolved = None
+			self.seating_indexes = seating
+			return [[self.players[p] for p in t] for t in seating]
+		if rng is None: rng = Random()
+		record = telemetry is not None
+		if self.restarts <= 1:
+			results = [_solve_restart((self, deadline, rng, record))]
+		else:
+			jobs = [(self, deadline, rng.getrandbits(64), record) for i in range(0, self.restarts)]
+			if (self.restart_workers or 1) > 1:
+				#multiprocessing is slow to import, so only imported when used
+				from concurrent.futures import ProcessPoolExecutor
+				with ProcessPoolExecutor(max_workers=self.restart_workers) as pool:
+					results = list(pool.map(_solve_restart, jobs))
+			else:
+				results = [_solve_restart(j) for j in jobs]
+		if record:
+			for r in results: telemetry.merge(r[3])
+		best = min(results, key=lambda x:x[0])
+		self.score = best[0]
+		self.stopped_early = any([x[1] for x in results])
+		self.seating_indexes = best[2]
+		return [[self.players[p] for p in t] for t in best[2]]
+
+	def batchable(self, max_tables):
+		'''True if a BatchSolver can balance this group: a default hill climb over 2 to
+		max_tables confirmed tables, with more players than one table seats, no time budget
+		or restarts of its own and no previous seating to reuse.'''
+		if self.is_admin_signup() or self.restarts > 1 or self.time_budget is not None: return False
+		if self.solver not in (None, 'hillclimb', HillClimb): return False
+		num_tables = min(self.tables, len(self.gmlist))
+		plist = self.players[:num_tables * self.seats_per_table]
+		if num_tables > max_tables or len(plist) <= self.seats_per_table: return False
+		return self.previous_seating(plist, num_tables) is None
+
+	def roster_key(self):
+		'''A key for the balancing problem this group poses, equal for groups the solver
+		would seat alike: the game system, table size, confirmed tables and solver
+		settings, and the team and roles of each player to seat, in signup order. None
+		for groups whose seating is not shared, such as those with a previous seating or
+		a PlayerTable of their own.'''
+		if self.previous_tables or self.player_table is not None or self.is_admin_signup(): return None
+		if self.solver is not None and not isinstance(self.solver, str): return None
+		num_tables = min(self.tables, len(self.gmlist))
+		plist = self.players[:num_tables * self.seats_per_table]
+		if not num_tables or len(plist) <= self.seats_per_table: return None
+		return (self._game_system.key, self.seats_per_table, num_tables, self.solver, self.restarts,
+			self.time_budget, tuple([(p.team.lower() if p.team else None, tuple(p._roles)) for p in plist]))
+
+	def keep_locations(self, tables):
+		'''Give tables the location they had in the previous muster, as long as they
+		still have the same game master. LocationManager honors these where it can.'''
+		previous = {}
+		for r in self.previous_tables:
+			previous[r['sub_id']] = r
+		for ta in tables:
+			r = previous.get(ta.sub_id, None)
+			if r is None or r['location'] is None: continue
+			if r['gm'] == (player_key(ta.gm) if ta.gm else None):
+				ta.location = r['location']
+
 	def is_admin_signup(self):
 		if self.seats_per_table < self._game_system.min_players or self.seats_per_table > self._game_system.max_players:
 			return True
@@ -178,11 +497,19 @@ class TableGroup:
 			msgs.append((desc + 'needs %d more %ss.' % (need, self._game_system.refname),5))
 		return (msgs,end_seating)
 
-	def seat_players(self):
+	def seat_players(self, deadline=None, rng=None, telemetry=None):
 		"""This should be the only public function, producing an array of TableAssignments
-		for the TableGroup"""
+		for the TableGroup. Balancing stops at the earlier of deadline, a time.monotonic()
+		value, and time_budget seconds from now, keeping the best seating found so far.
+		rng is the random.Random to balance with, by default a freshly seeded one.
+		Solver runs are recorded in telemetry, if given."""
 		(msgs, end) = self.message_log()
+		self.stopped_early = False
+		self.seating_indexes = None
 		if end: return [msgs]
+		if self.time_budget is not None:
+			own_deadline = monotonic() + self.time_budget
+			deadline = own_deadline if deadline is None else min(deadline, own_deadline)
 
 		tables = []
 		num_tables = min(self.tables, len(self.gmlist))
@@ -201,8 +528,12 @@ class TableGroup:
 			if len(plist) <= self.seats_per_table:
 				tables[0].players = plist
 			else:
-				ts = TableSolver(self)
-				seating = ts.seat_players()
+				seating = self.previous_seating(plist, num_tables)
+				if seating is None: seating = self.solve(deadline, rng, telemetry)
+				if self.stopped_early:
+					desc = self.event + ' on ' + self.start_time.strftime('%B %d at %I:%M%p ')
+					msgs.append((desc + 'ran out of time while balancing tables; '
+					'the best seating found so far was used.', 6))
 				for i in range(0,len(seating)):
 					tables[i].players = seating[i]
 		npos = max_seats
@@ -214,6 +545,8 @@ class TableGroup:
 				ta.players = self.players[npos:npos+self.seats_per_table]
 				tables.append(ta)
 				npos += self.seats_per_table
+		if self.previous_tables:
+			self.keep_locations(tables)
 		wlist = self.players[npos:]
 		if wlist:
 			sub_id += 1
@@ -222,11 +555,56 @@ class TableGroup:
 		tables.append(msgs)
 		return tables
 
+def _solve_restart(job):
+	'''One run of the TableSolver for a TableGroup, possibly in a worker process.
+	Returns the score, whether it ran out of time, the seating as player indexes and,
+	if record is set, a Telemetry for the run.'''
+	(tg, deadline, rng, record) = job
+	if not isinstance(rng, Random): rng = Random(rng)
+	telemetry = Telemetry() if record else None
+	ts = TableSolver(tg, deadline=deadline, rng=rng, telemetry=telemetry)
+	ts.solve()
+	return (ts.score, ts.stopped_early, ts.table_indexes(), telemetry)
+
+def player_key(p):
+	'''Identify a Player, or a player dictionary from as_dict, between musters: by id,
+	or by name and team for players without one.'''
+	if isinstance(p, dict): (pid, name, team) = (p.get('id', None), p.get('name', None), p.get('team', None))
+	else: (pid, name, team) = (p.id, p.name, p.team)
+	if pid is None: return ('name', name, team)
+	return ('id', pid)
+
+#columns of the player, unit and table totals score_totals works from, followed by
+#the role totals
+SEATED, UNKNOWN, LVLED, LVL_SUM, LVL_SQ, ROLES = range(0, 6)
+
+def score_totals(totals, seats, min_players):
+	'''TableSolver.score_table for an array of table totals, see TableSolver.player_totals.
+	The spread of levels comes from the sum of levels and of their squares.'''
+	seated = totals[..., SEATED]
+	lvled = totals[..., LVLED]
+	erole = (np.maximum(0.0, 1.0 - totals[..., ROLES:]) ** 2).sum(axis=-1)
+	erole -= (1 - (0.6 ** erole)) * totals[..., UNKNOWN]
+	error = np.maximum(0.0, erole) * 100
+	spread = totals[..., LVL_SQ] - totals[..., LVL_SUM] ** 2 / np.maximum(lvled, 1)
+	error += np.where(lvled > 0, spread, 0.0) + seated - lvled
+	error += ((seated > seats) | (seated < min_players)) * 100000.0
+	return error
+
 class TableSolver:
 	'''Balance and seat large groups of players across large numbers of tables.
 	No user serviceable parts.'''
-	def __init__(self,tg):
+	def __init__(self,tg, strategy=None, deadline=None, rng=None, telemetry=None):
 		self.table_group = tg
+		self.rng = rng if rng is not None else Random()
+		self.score = None
+		self.deadline = deadline
+		self.stopped_early = False
+		self.telemetry = telemetry
+		self.attempts = 0
+		self.accepts = 0
+		self.iterations = 0
+		self.converged_at = 0
 		max_tables = min(tg.tables, len(tg.gmlist))
 		max_seats = max_tables * tg.seats_per_table
 
@@ -238,12 +616,17 @@ class TableSolver:
 		if self.to_seat % tg.seats_per_table: self.need_tables += 1
 		self.need_tables = min(self.need_tables, max_tables)
 		self.players = tg.players[:self.to_seat]
-		self.setup_players()
-		self.seating_groups()
+		with timed_phase(telemetry, 'role_setup'):
+			self.setup_players()
+			self.seating_groups()
 		self.seating = [-1] * len(self.assignable)
+		self.proven = False
+		if strategy is None and tg.solver is None and not tg.warm_start and ExactSearch.suits(self):
+			strategy = ExactSearch()
+		self.strategy = solver_strategy(strategy if strategy is not None else tg.solver)
 		
-	def player_lists_for_seating(self):
-		'''Turn a seating chart in terms of assignable units to list sof players.'''
+	def table_indexes(self):
+		'''Turn a seating chart in terms of assignable units to lists of player indexes.'''
 		tables = []
 		for i in range(0,self.need_tables):
 			tables.append([])
@@ -254,167 +637,848 @@ class TableSolver:
 				tables[table_num].append(p)
 		return tables 
 
+	def player_lists_for_seating(self):
+		'''Turn a seating chart in terms of assignable units to list sof players.'''
+		return [[self.players[p] for p in t] for t in self.table_indexes()]
+
 	def seat_players(self):
-		self.initial_seating()
-		self.fix_seating()
+		self.solve()
 		return self.player_lists_for_seating()
 
+	def solve(self):
+		'''Seat and balance the players, recording the run if there is telemetry.'''
+		with timed_phase(self.telemetry, 'initial_seating'):
+			self.initial_seating()
+		with timed_phase(self.telemetry, 'swaps'):
+			self.fix_seating()
+		if self.telemetry is not None: self.telemetry.solver_run(self)
+
 	def num_tables_to_muster(num_gm, num_pc, num_locations):
 		max_tables = max()
 
 	def setup_players(self):
-		'''Prepare player input objects for actual use.'''
-		for p in self.players:
-			if not p._roles: continue
-			accum = np.zeros(self.num_roles)
-			lvls = 0
-			blocks = 0
-			for r in p._roles:
-				if not r[0]: continue
-				if not r[1]: continue
-				use_role = r[0].lower()
-				if use_role not in self.table_group._game_system.roles: continue
-				accum = accum + self.table_group._game_system.roles[use_role] * r[1]
-				lvls += r[1]
-				blocks = 1
-			if lvls: accum = accum / lvls
-			for r in p._roles:
-				if not r[0]: continue
-				if r[1]: continue
-				use_role = r[0].lower()
-				if use_role not in self.table_group._game_system.roles: continue
-				accum = accum + self.table_group._game_system.roles[use_role] 
-				blocks += 1
-			if blocks: accum = accum / blocks
-			p._rolev = accum
-			p._level = 0
-			for r in p._roles:
-				if r[1]: p._level += r[1]
+		'''Prepare role vectors, levels and teams for the players to seat, taken from the
+		TableGroup's PlayerTable when it has one. Results are rows of self.rolev,
+		self.levels and self.team_ids.'''
+		gsys = self.table_group._game_system
+		table = self.table_group.player_table
+		if table is None:
+			table = PlayerTable.from_players(self.players, gsys)
+		elif table.rolev.shape[1] != self.num_roles or len(table) < len(self.players):
+			raise RuntimeError('Player table does not match the players of %s.' % self.table_group.event)
+		num = len(self.players)
+		self.rolev = table.rolev[:num]
+		self.levels = table.levels[:num]
+		self.team_ids = table.team_ids[:num]
+		self.teams = table.teams
 
-	def initial_seating(self):
-		'''Initial seating without regard to table balance. Might be worth improving.'''
-		units = len(self.seating) #assignable seating units. people or groups
-		tidx = 0
+	def warm_seating(self, previous):
+		'''Initial seating from a previous muster, given as lists of player keys by table.
+		The largest need_tables units anchor a table each, the one most of their members
+		sat at if no other unit has taken it. Other units go to the table most of their
+		members sat at if it has room short of an even share of the players, so a table
+		added since fills as well, and the rest to the tables with the fewest players,
+		split into single players if they must be.'''
+		prev_table = {}
+		for t in range(0, min(len(previous), self.need_tables)):
+			for k in previous[t]:
+				prev_table[k] = t
+		keys = [player_key(p) for p in self.players]
 		sitting = [0] * self.need_tables
+		even_share = -(-self.to_seat // self.need_tables)
 		self.assignable.sort(reverse=True,key=lambda x: len(x))
-		for i in range(0,units):
-			limit = 0
-			while (sitting[tidx] + len(self.assignable[i])) > self.seats_per_table:
-				tidx = (tidx + 1) % self.need_tables
-				limit += 1
-				if limit == self.need_tables+1:
-					self.assignable.append(self.assignable[i][1:])
-					self.assignable[i] = [self.assignable[i][0]]
+		pending = []
+		for i in range(0, len(self.assignable)):
+			unit = self.assignable[i]
+			votes = Counter([prev_table[keys[p]] for p in unit if keys[p] in prev_table])
+			choices = [t for (t, n) in votes.most_common()]
+			if i < self.need_tables:
+				t = [x for x in choices + list(range(0, self.need_tables)) if not sitting[x]][0]
+				sitting[t] += len(unit)
+				self.seating[i] = t
+				continue
+			for t in choices:
+				if sitting[t] + len(unit) <= even_share:
+					sitting[t] += len(unit)
+					self.seating[i] = t
+					break
+			else:
+				pending.append(i)
+		for i in pending:
+			t = min(range(0, self.need_tables), key=lambda x: sitting[x])
+			if sitting[t] + len(self.assignable[i]) > self.seats_per_table:
+				for p in self.assignable[i][1:]:
+					self.assignable.append([p])
 					self.seating.append(-1)
-			sitting[tidx] += len(self.assignable[i])
+					pending.append(len(self.assignable) - 1)
+				self.assignable[i] = self.assignable[i][:1]
+			sitting[t] += len(self.assignable[i])
+			self.seating[i] = t
+
+	def player_totals(self):
+		'''One row per player of the totals score_totals works from: a seat, an unknown
+		role, a known level, the level and its square, then the role vector of players
+		with known roles.'''
+		known = self.rolev.sum(axis=1) != 0
+		levels = self.levels
+		return np.column_stack([np.ones(len(levels)), ~known, levels != 0, levels, levels ** 2,
+			self.rolev * known[:, None]])
+
+	def initial_seating(self):
+		'''Greedy initial seating. The largest need_tables units anchor a table each. Each
+		other unit, largest first, then goes to the table whose error it raises least, among
+		tables with room for it short of an even share of the players, so tables still fill
+		evenly. Units that fit at no table are split, seating one member and the rest later.'''
+		if self.table_group.warm_start:
+			return self.warm_seating(self.table_group.warm_start)
+		self.assignable.sort(reverse=True,key=lambda x: len(x))
+		players = self.player_totals()
+		totals = np.zeros((self.need_tables, players.shape[1]))
+		sitting = np.zeros(self.need_tables, dtype=int)
+		even_share = -(-self.to_seat // self.need_tables)
+		min_players = self.table_group._game_system.min_players
+		scores = score_totals(totals, self.seats_per_table, min_players)
+		i = 0
+		while i < len(self.assignable):
+			unit = self.assignable[i]
+			added = players[unit].sum(axis=0)
+			if i < self.need_tables:
+				tidx = i
+			else:
+				room = sitting + len(unit) <= even_share
+				if not room.any(): room = sitting + len(unit) <= self.seats_per_table
+				if not room.any():
+					self.assignable.append(unit[1:])
+					self.assignable[i] = unit[:1]
+					self.seating.append(-1)
+					continue
+				rise = score_totals(totals + added, self.seats_per_table, min_players) - scores
+				tidx = int(np.argmin(np.where(room, rise, np.inf)))
+			totals[tidx] += added
+			sitting[tidx] += len(unit)
+			scores[tidx] = score_totals(totals[tidx], self.seats_per_table, min_players)
 			self.seating[i] = tidx
-			tidx = (tidx + 1) % self.need_tables
+			i += 1
 			
 	def split_groups(self,roster):
-		'''Split a large group into a seatable groups'''
-		to_remove = []
-		to_add = []
+		'''Split groups too large for a table in half, and those halves again, until every
+		group is seatable. Groups that fit keep their place, followed by the halves in the
+		order they were split off.'''
+		seatable = []
+		too_large = []
 		for g in roster:
-			if len(g) > self.seats_per_table:
-				sp = int(len(g) / 2)
-				g1 = g[0:sp]
-				g2 = g[sp:]
-				to_remove.append(g)
-				to_add.append(g1)
-				to_add.append(g2)
-		for x in to_remove:
-			roster.remove(x)
-		roster = roster + to_add
-		if to_add: return self.split_groups(roster)
-		return roster
+			if len(g) > self.seats_per_table: too_large.append(g)
+			else: seatable.append(g)
+		#too_large grows as halves are split off, so each one is visited once
+		for g in too_large:
+			sp = len(g) // 2
+			for half in (g[0:sp], g[sp:]):
+				if len(half) > self.seats_per_table: too_large.append(half)
+				else: seatable.append(half)
+		return seatable
 			
 	def seating_groups(self):
 		'''Turn a list of players into a list of assignable units. Assignable
-		units are teams or individual players.'''
-		roster = group_by(self.players, 
-			grouping=lambda x:x.team.lower() if x.team else None,
-			sorting=lambda x:x.team.lower() if x.team else 'ZZZZZZZZ')
+		units are teams or individual players, as lists of indexes into self.players.'''
+		teams = [self.teams[x] if x >= 0 else None for x in self.team_ids.tolist()]
+		roster = group_by(range(0, len(self.players)),
+			grouping=lambda x:teams[x],
+			sorting=lambda x:teams[x] if teams[x] else 'ZZZZZZZZ')
 		self.assignable = self.split_groups(roster)
 		self.assignable.sort(key=lambda x: len(x), reverse=True)
 
+	def index_tables(self):
+		'''Build per table membership lists and running aggregates for the current
+		seating, so a table can be scored without scanning the whole seating chart.
+		Members are kept in seating order, which keeps scores identical to a full scan.'''
+		self.table_units = []
+		self.table_stats = []
+		#one extra slot, so units still at seating -1 are indexed apart from the real tables
+		for i in range(0, self.need_tables + 1):
+			self.table_units.append([])
+			self.table_stats.append([0, 0, 0, 0, 0])
+		self.unit_stats = []
+		self.unit_roles = []
+		self.unit_levels = []
+		known = self.rolev.sum(axis=1) != 0
+		player_levels = self.levels.tolist()
+		for grp in self.assignable:
+			roles = [self.rolev[p] for p in grp if known[p]]
+			levels = [player_levels[p] for p in grp]
+			lvled = [x for x in levels if x]
+			self.unit_roles.append(roles)
+			self.unit_levels.append(levels)
+			self.unit_stats.append((len(grp), len(roles), len(grp) - len(roles), len(lvled), sum(lvled)))
+		for i in range(0, len(self.seating)):
+			self.add_unit(i, self.seating[i])
+
+	def add_unit(self, unit, tbnum):
+		insort(self.table_units[tbnum], unit)
+		self.table_stats[tbnum] = [x + y for x, y in zip(self.table_stats[tbnum], self.unit_stats[unit])]
+
+	def remove_unit(self, unit, tbnum):
+		units = self.table_units[tbnum]
+		del units[bisect_left(units, unit)]
+		self.table_stats[tbnum] = [x - y for x, y in zip(self.table_stats[tbnum], self.unit_stats[unit])]
+
+	def move_unit(self, unit, tbnum):
+		self.remove_unit(unit, self.seating[unit])
+		self.add_unit(unit, tbnum)
+		self.seating[unit] = tbnum
+
 	def score_table(self, tbnum):
 		'''Error functino for table balance. Lower scores are better.'''
+		(seated, known_roles, unknown_roles, lvled, total_levels) = self.table_stats[tbnum]
 		error = 0.0
 		total_roles = np.zeros(self.num_roles)
-		unknown_roles = 0
-		known_roles = 0
-		lvled = 0
-		total_levels = 0
-		seated = 0
-		plist = []
-		for i in range(0,len(self.seating)):
-			if self.seating[i] != tbnum: continue
-			pu = self.assignable[i]
-			for p in pu:
-				seated += 1
-				plist.append(p)
-				if np.sum(p._rolev):
-					total_roles += p._rolev
-					known_roles += 1
-				else:
-					unknown_roles += 1
-				if p._level:
-					total_levels += p._level
-					lvled += 1
+		units = self.table_units[tbnum]
+		for i in units:
+			for r in self.unit_roles[i]:
+				total_roles += r
 		erole = sum(np.maximum(0,self.target - total_roles) ** 2)
 		erole -= (1 - (0.6 ** erole)) * unknown_roles
 		error = max(0, erole) * 100
 		if lvled: avg_lvl = total_levels / lvled
 		dev = 0
-		for p in plist:
-			if not p._level: dev += 1
-			else: dev += (avg_lvl - p._level) ** 2
+		for i in units:
+			for lvl in self.unit_levels[i]:
+				if not lvl: dev += 1
+				else: dev += (avg_lvl - lvl) ** 2
 		error += dev
 		if seated > self.seats_per_table or seated < self.table_group._game_system.min_players:
 			error += 100000.0
 		return error
 
+	def out_of_time(self):
+		'''True once the deadline has passed, noting that the search was cut short.'''
+		if self.deadline is None or monotonic() < self.deadline: return False
+		self.stopped_early = True
+		return True
+
+	def total_score(self):
+		return sum([self.score_table(i) for i in range(0, self.need_tables)])
+
 	def fix_seating(self):
-		'''Keep swapping people until we can no longer reduce the error.
+		'''Improve the initial seating with the configured search strategy.
 		Attempts to raise efficency or improve seating should start here.'''
+		self.index_tables()
+		self.score = self.strategy.optimize(self)
+
+class SolverStrategy:
+	'''Base class for the searches TableSolver.fix_seating can run. Subclasses implement
+	optimize(solver), which rearranges solver.seating and returns the final total score.
+	The first need_tables assignable units anchor their tables and are never moved.
+	Subclasses also set solver.attempts, accepts, iterations and converged_at: the
+	moves tried, moves kept, steps taken and the last step that improved the score.'''
+	move_rate = 0.0
+
+	def optimize(self, solver):
+		raise NotImplementedError
+
+	def neighbour(self, solver):
+		'''Pick a random move: a list of (unit, new table) pairs, either swapping two
+		units or moving a single unit to another table. Returns None for a non move.'''
+		rng = solver.rng
+		unit1 = rng.randrange(solver.need_tables, len(solver.seating))
+		table1 = solver.seating[unit1]
+		if table1 < 0: return None
+		if rng.random() < self.move_rate:
+			table2 = rng.randrange(0, solver.need_tables)
+			if table1 == table2: return None
+			return [(unit1, table2)]
+		unit2 = rng.randrange(solver.need_tables, len(solver.seating))
+		table2 = solver.seating[unit2]
+		if table2 < 0 or table1 == table2: return None
+		return [(unit1, table2), (unit2, table1)]
+
+	def apply(self, solver, scores, moves):
+		'''Make a move. Returns the change in total score, the new scores of the
+		tables involved and the moves needed to undo it.'''
+		undo = [(u, solver.seating[u]) for (u, t) in reversed(moves)]
+		touched = set([t for (u, t) in moves] + [t for (u, t) in undo])
+		for (u, t) in moves:
+			solver.move_unit(u, t)
+		new_scores = {}
+		delta = 0.0
+		for t in touched:
+			new_scores[t] = solver.score_table(t)
+			delta += new_scores[t] - scores[t]
+		return (delta, new_scores, undo)
+
+	def revert(self, solver, undo):
+		for (u, t) in undo:
+			solver.move_unit(u, t)
+
+	def restore(self, solver, seating):
+		if seating != solver.seating:
+			solver.seating[:] = seating
+			solver.index_tables()
+
+class HillClimb(SolverStrategy):
+	'''Keep swapping people until we can no longer reduce the error. Gives up after
+	max_fails consecutive failed swaps, by default half the number of units squared.'''
+	def __init__(self, max_fails=None):
+		self.max_fails = max_fails
+
+	def fail_limit(self, units):
+		return self.max_fails or max(1, units ** 2 // 2)
+
+	def optimize(self, solver):
 		scores = []
-		found = []
-		for i in range(0, self.need_tables):
-			scores.append(self.score_table(i))
-		min_pos = self.need_tables
-		max_pos = len(self.seating)
-		max_fails = max_pos ** 2
+		for i in range(0, solver.need_tables):
+			scores.append(solver.score_table(i))
+		min_pos = solver.need_tables
+		max_pos = len(solver.seating)
+		max_fails = self.fail_limit(max_pos)
+		randrange = solver.rng.randrange
 		fails = 0
-		if min_pos >= max_pos: return
-		while fails < max_fails:
+		iterations = attempts = accepts = converged_at = 0
+		if min_pos >= max_pos: return sum(scores)
+		while fails < max_fails and not solver.out_of_time():
+			iterations += 1
 			seat1 = randrange(min_pos,max_pos)
-			table1 = self.seating[seat1]
+			table1 = solver.seating[seat1]
 			seat2 = randrange(min_pos,max_pos)
-			table2 = self.seating[seat2]
+			table2 = solver.seating[seat2]
 			if table1 == table2:
 				fails += 1 
 				continue
+			attempts += 1
 			target = scores[table1] + scores[table2]
 
-			self.seating[seat1] = table2
-			self.seating[seat2] = table1
-			s1 = self.score_table(table1)
-			s2 = self.score_table(table2)
+			solver.move_unit(seat1, table2)
+			solver.move_unit(seat2, table1)
+			s1 = solver.score_table(table1)
+			s2 = solver.score_table(table2)
 			if (s1 + s2) < target:
 				scores[table1] = s1
 				scores[table2] = s2
 				fails = 0
+				accepts += 1
+				converged_at = iterations
+			else:
+				solver.move_unit(seat1, table1)
+				solver.move_unit(seat2, table2)
+				fails += 1
+		(solver.iterations, solver.attempts, solver.accepts, solver.converged_at) = (
+			iterations, attempts, accepts, converged_at)
+		return solver.total_score()
+
+class Annealing(SolverStrategy):
+	'''Simulated annealing over swap and move neighbourhoods, with geometric cooling
+	from start_temp to end_temp. Runs iterations steps, by default iterations_per_unit
+	times the number of movable units, and keeps the best seating seen.'''
+	def __init__(self, iterations=None, iterations_per_unit=400, start_temp=5.0,
+			end_temp=0.05, move_rate=0.05):
+		self.iterations = iterations
+		self.iterations_per_unit = iterations_per_unit
+		self.start_temp = start_temp
+		self.end_temp = end_temp
+		self.move_rate = move_rate
+
+	def optimize(self, solver):
+		scores = [solver.score_table(i) for i in range(0, solver.need_tables)]
+		movable = len(solver.seating) - solver.need_tables
+		if movable <= 0: return sum(scores)
+		iterations = self.iterations or self.iterations_per_unit * movable
+		cooling = (self.end_temp / self.start_temp) ** (1.0 / iterations)
+		temp = self.start_temp
+		current = best = sum(scores)
+		best_seating = list(solver.seating)
+		steps = attempts = accepts = converged_at = 0
+		for it in range(0, iterations):
+			if solver.out_of_time(): break
+			steps += 1
+			temp *= cooling
+			moves = self.neighbour(solver)
+			if not moves: continue
+			attempts += 1
+			(delta, new_scores, undo) = self.apply(solver, scores, moves)
+			if delta < 0 or solver.rng.random() < exp(-delta / temp):
+				accepts += 1
+				for t in new_scores: scores[t] = new_scores[t]
+				current += delta
+				if current < best:
+					best = current
+					best_seating = list(solver.seating)
+					converged_at = steps
+			else:
+				self.revert(solver, undo)
+		(solver.iterations, solver.attempts, solver.accepts, solver.converged_at) = (
+			steps, attempts, accepts, converged_at)
+		self.restore(solver, best_seating)
+		return solver.total_score()
+
+class TabuSearch(SolverStrategy):
+	'''Tabu search. Random moves are tried as in HillClimb, keeping any that improve the
+	score, unless they return a unit to a table it left in the last tenure moves and do not
+	beat the best seating found. Once candidates moves in a row have failed, by default
+	one for each movable unit, the least bad of them is made anyway, to escape the local
+	minimum. Stops after patience escapes without a new best seating, or after iterations
+	moves tried, by default iterations_per_unit times the number of movable units, and
+	keeps the best seating seen.'''
+	EPSILON = 1e-9
+
+	def __init__(self, iterations=None, iterations_per_unit=2000, candidates=None, tenure=None,
+			patience=30, move_rate=0.05):
+		self.iterations = iterations
+		self.iterations_per_unit = iterations_per_unit
+		self.candidates = candidates
+		self.tenure = tenure
+		self.patience = patience
+		self.move_rate = move_rate
+
+	def optimize(self, solver):
+		scores = [solver.score_table(i) for i in range(0, solver.need_tables)]
+		movable = len(solver.seating) - solver.need_tables
+		if movable <= 0: return sum(scores)
+		iterations = self.iterations or self.iterations_per_unit * movable
+		candidates = self.candidates or max(20, movable)
+		tenure = self.tenure or max(7, solver.need_tables // 4)
+		#(unit, table) pairs a unit may not move back to until that many moves have been made
+		tabu = {}
+		current = best = sum(scores)
+		best_seating = list(solver.seating)
+		fails = escapes = 0
+		escape = None
+		steps = attempts = accepts = converged_at = 0
+		for it in range(0, iterations):
+			if solver.out_of_time(): break
+			steps += 1
+			moves = self.neighbour(solver)
+			if not moves: continue
+			attempts += 1
+			(delta, new_scores, undo) = self.apply(solver, scores, moves)
+			forbidden = [u for (u, t) in moves if tabu.get((u, t), -1) >= accepts]
+			if delta < -self.EPSILON and (not forbidden or current + delta < best - self.EPSILON):
+				fails = 0
+				escape = None
 			else:
-				self.seating[seat1] = table1
-				self.seating[seat2] = table2
+				self.revert(solver, undo)
 				fails += 1
+				if not forbidden and (escape is None or delta < escape[0]):
+					escape = (delta, moves)
+				if fails < candidates: continue
+				fails = 0
+				escapes += 1
+				if escapes > self.patience: break
+				if escape is None: continue
+				(delta, new_scores, undo) = self.apply(solver, scores, escape[1])
+				escape = None
+			accepts += 1
+			for t in new_scores: scores[t] = new_scores[t]
+			current += delta
+			for (u, t) in undo:
+				tabu[(u, t)] = accepts + tenure
+			if current < best - self.EPSILON:
+				best = current
+				best_seating = list(solver.seating)
+				escapes = 0
+				converged_at = steps
+		(solver.iterations, solver.attempts, solver.accepts, solver.converged_at) = (
+			steps, attempts, accepts, converged_at)
+		self.restore(solver, best_seating)
+		return solver.total_score()
+
+LN_06 = log(0.6)
+
+def _role_error(e, unknown):
+	'''The role part of score_table, before scaling, for a sum of squared role shortfalls
+	e at a table with unknown players of unknown role.'''
+	return max(0.0, e - (1 - 0.6 ** e) * unknown)
+
+def _role_floor(e, unknown):
+	'''Lowest _role_error for shortfalls of e or more, with its slope there. _role_error is
+	convex in e but falls at first when unknown is large, so below its minimum the
+	minimum is used, which makes the floor rise with e.'''
+	if unknown > 0 and -unknown * LN_06 > 1:
+		e = max(e, log(-1.0 / (unknown * LN_06)) / LN_06)
+	error = _role_error(e, unknown)
+	return (error, 1 + unknown * LN_06 * 0.6 ** e if error > 0 else 0.0)
+
+def _least_shortfall(shortfalls, amount):
+	'''Least sum of squared shortfalls left after sharing out amount of a role among
+	tables short by shortfalls, topping up the largest first.'''
+	short = sorted([x for x in shortfalls if x > 0], reverse=True)
+	filled = 0.0
+	for i in range(0, len(short)):
+		filled += short[i]
+		level = short[i + 1] if i + 1 < len(short) else 0.0
+		if filled - (i + 1) * level >= amount:
+			level = (filled - amount) / (i + 1)
+			return (i + 1) * level * level + sum([x * x for x in short[i + 1:]])
+	return 0.0
+
+class ExactSearch(SolverStrategy):
+	'''Branch and bound over every assignment of units to tables, for groups of a few
+	tables. The initial seating's score is the one to beat, after a HillClimb giving up after
+	max_fails failed swaps if that is set. Units are then placed
+	in turn, each at every table with room for it, except that only the first empty table
+	is tried, as empty tables are interchangeable. A partial seating is dropped as soon as
+	a lower bound on its final score is no better than the best found. The search gives up
+	after max_nodes placements, keeping the best seating found, which is then not
+	necessarily optimal; solver.proven is set when it finishes.'''
+	def __init__(self, max_nodes=20000, max_fails=None):
+		self.max_nodes = max_nodes
+		self.max_fails = max_fails
+
+	@staticmethod
+	def suits(solver, max_units=12):
+		'''True for groups small enough to search by default: two tables of up to
+		max_units players and teams. Larger groups, and three tables, search far more
+		nodes than a hill climb takes swaps.'''
+		return solver.need_tables == 2 and len(solver.assignable) <= max_units
+
+	def optimize(self, solver):
+		#a full climb costs more than the search it saves, so by default there is none
+		if self.max_fails: HillClimb(self.max_fails).optimize(solver)
+		best = solver.total_score()
+		solver.proven = False
+		if solver.need_tables < 2 or solver.out_of_time(): return best
+		search = _BranchAndBound(solver, best, self.max_nodes)
+		search.place(0, 0)
+		solver.proven = not search.stopped
+		solver.iterations += search.nodes
+		solver.attempts += search.nodes
+		if search.best_seating is None: return best
+		solver.accepts += 1
+		solver.converged_at = solver.iterations - search.nodes + search.improved_at
+		for (i, unit) in enumerate(search.order):
+			if solver.seating[unit] != search.best_seating[i]:
+				solver.move_unit(unit, search.best_seating[i])
+		return solver.total_score()
+
+class _BranchAndBound:
+	'''The state of one ExactSearch: running totals for each table, as in
+	TableSolver.table_stats, and what is left to place after each step.'''
+	EPSILON = 1e-9
+
+	def __init__(self, solver, best, max_nodes):
+		self.solver = solver
+		self.best = best - self.EPSILON
+		self.best_seating = None
+		self.max_nodes = max_nodes
+		self.nodes = 0
+		self.improved_at = 0
+		self.stopped = False
+		units = len(solver.assignable)
+		levels = [[x for x in solver.unit_levels[i] if x] for i in range(0, units)]
+		everyone = [x for lv in levels for x in lv]
+		mean = sum(everyone) / len(everyone) if everyone else 0.0
+		#units with the most extreme levels go first, which tightens the bound on level
+		#spread soonest
+		self.order = sorted(range(0, units), key=lambda i:
+			(-sum([(x - mean) ** 2 for x in levels[i]]), -len(solver.assignable[i])))
+		self.num_roles = solver.num_roles
+		self.seats = solver.seats_per_table
+		self.min_players = solver.table_group._game_system.min_players
+		self.unit_figures = []
+		self.unit_role_totals = []
+		for i in self.order:
+			(seated, known, unknown, lvled, total) = solver.unit_stats[i]
+			self.unit_figures.append((seated, unknown, lvled, total, sum([x * x for x in levels[i]])))
+			self.unit_role_totals.append(sum(solver.unit_roles[i], np.zeros(self.num_roles)).tolist())
+		#everything still to place before unit d is placed, for each d
+		self.left_roles = [[0.0] * self.num_roles]
+		self.left_unknown = [0]
+		self.left_seated = [0]
+		left_levels = [Counter()]
+		for d in range(units - 1, -1, -1):
+			self.left_roles.append([x + y for (x, y) in zip(self.left_roles[-1], self.unit_role_totals[d])])
+			self.left_unknown.append(self.left_unknown[-1] + self.unit_figures[d][1])
+			self.left_seated.append(self.left_seated[-1] + self.unit_figures[d][0])
+			left_levels.append(left_levels[-1] + Counter(levels[self.order[d]]))
+		self.left_roles.reverse()
+		self.left_unknown.reverse()
+		self.left_seated.reverse()
+		self.left_levels = [list(x.items()) for x in reversed(left_levels)]
+		self.unleveled = sum([x[0] - x[2] for x in self.unit_figures])
+		#what each table holds so far, and its table_terms, updated only for the table
+		#each unit is placed at
+		empty = ([0, 0, 0, 0.0, 0.0], [0.0] * self.num_roles)
+		self.tables = [empty] * solver.need_tables
+		self.terms = [self.table_terms(*empty)] * solver.need_tables
+		self.seating = [-1] * units
+
+	def table_terms(self, figures, roles):
+		'''What a table holding figures and roles adds to the bound, whatever is still to be
+		placed: its players, those of unknown role, its level spread, its level centre and
+		weight, and how short it is of each role.'''
+		(seated, unknown, lvled, total, squares) = figures
+		spread = 0.0
+		centre = None
+		if lvled:
+			spread = squares - total * total / lvled
+			centre = (total / lvled, lvled / (lvled + self.seats - seated))
+		return (seated, unknown, spread, centre, [1.0 - x for x in roles])
+
+	def bound(self, d, t=None, terms=None):
+		'''A lower bound on the final score of any seating completing the current one, where
+		units from d on are still to be placed, with table t's terms replaced by terms if
+		given. Unleveled players always add the same. Level spread can only grow, and each
+		leveled player still to place adds at least what joining the closest table would,
+		scaled down for the room left there. Role shortfalls can at best be shared out
+		evenly from the roles left, and every player of unknown role still to place may yet
+		sit at any table. With every unit placed, the bound is the score itself.'''
+		tables = self.terms
+		if t is not None:
+			tables = list(tables)
+			tables[t] = terms
+		left = self.left_roles[d]
+		left_seated = self.left_seated[d]
+		left_unknown = self.left_unknown[d]
+		done = d == len(self.seating)
+		score = float(self.unleveled)
+		floor = 0.0
+		slope = None
+		for (seated, unknown, spread, centre, shortfalls) in tables:
+			score += spread
+			if seated + left_seated < self.min_players: score += 100000.0
+			e = 0.0
+			for (short, more) in zip(shortfalls, left):
+				short -= more
+				if short > 0: e += short * short
+			if done:
+				floor += _role_error(e, unknown)
+				continue
+			(error, rise) = _role_floor(e, unknown + left_unknown)
+			floor += error
+			if slope is None or rise < slope: slope = rise
+		centres = [x[3] for x in tables if x[3] is not None]
+		if len(centres) == len(tables):
+			for (lvl, count) in self.left_levels[d]:
+				score += count * min([w * (lvl - c) * (lvl - c) for (c, w) in centres])
+		bound = score + floor * 100
+		#what follows only raises the bound, so is not needed to rule this seating out
+		if not slope or bound >= self.best: return bound
+		#sharing out a role only raises the floor above what each table alone allows
+		#when several tables are short of it and the units left cannot make up for all
+		extra = 0.0
+		for r in range(0, self.num_roles):
+			more = left[r]
+			if not more: continue
+			shortfalls = [x[4][r] for x in tables if x[4][r] > 0]
+			if len(shortfalls) < 2 or sum(shortfalls) <= more: continue
+			if len(shortfalls) == 2:
+				(a, b) = (max(shortfalls), min(shortfalls))
+				shared = (a - more) ** 2 + b * b if a - b >= more else (a + b - more) ** 2 / 2
+			else:
+				shared = _least_shortfall(shortfalls, more)
+			extra += shared - sum([(x - more) ** 2 for x in shortfalls if x > more])
+		if extra > 0: bound += slope * extra * 100
+		return bound
+
+	def place(self, d, used):
+		'''Try every table with room for unit d, most promising first, where the first
+		used tables hold the units placed so far.'''
+		if self.stopped: return
+		self.nodes += 1
+		if self.nodes > self.max_nodes or (self.nodes % 256 == 0 and self.solver.out_of_time()):
+			self.stopped = True
+			return
+		if d == len(self.seating):
+			score = self.bound(d)
+			if score < self.best:
+				self.best = score - self.EPSILON
+				self.best_seating = list(self.seating)
+				self.improved_at = self.nodes
+			return
+		tried = []
+		(unit_figures, unit_roles) = (self.unit_figures[d], self.unit_role_totals[d])
+		for t in range(0, min(used + 1, len(self.tables))):
+			(figures, roles) = self.tables[t]
+			if figures[0] + unit_figures[0] > self.seats: continue
+			#placing unit d changes the terms of only the table it goes to
+			figures = [x + y for (x, y) in zip(figures, unit_figures)]
+			roles = [x + y for (x, y) in zip(roles, unit_roles)]
+			terms = self.table_terms(figures, roles)
+			score = self.bound(d + 1, t, terms)
+			if score < self.best: tried.append((score, t, (figures, roles), terms))
+		tried.sort(key=lambda x: x[:2])
+		for (score, t, table, terms) in tried:
+			if score >= self.best: break
+			if d + 1 == len(self.seating):
+				#with every unit placed the bound is the score, so there is nothing to search
+				self.nodes += 1
+				self.seating[d] = t
+				self.best = score - self.EPSILON
+				self.best_seating = list(self.seating)
+				self.improved_at = self.nodes
+				break
+			(old_table, old_terms) = (self.tables[t], self.terms[t])
+			(self.tables[t], self.terms[t]) = (table, terms)
+			self.seating[d] = t
+			self.place(d + 1, max(used, t + 1))
+			(self.tables[t], self.terms[t]) = (old_table, old_terms)
+		self.seating[d] = -1
+
+SOLVER_STRATEGIES = {
+	'hillclimb' : HillClimb,
+	'anneal' : Annealing,
+	'tabu' : TabuSearch,
+	'exact' : ExactSearch
+}
+
+def solver_strategy(strategy):
+	'''Turn a strategy name, SolverStrategy class or instance into a SolverStrategy.'''
+	if strategy is None: return HillClimb()
+	if isinstance(strategy, SolverStrategy): return strategy
+	if isinstance(strategy, str):
+		if strategy not in SOLVER_STRATEGIES:
+			raise RuntimeError('Solver strategy %s not defined.' % strategy)
+		return SOLVER_STRATEGIES[strategy]()
+	return strategy()
+
+class BatchSolver:
+	"""Balance many small TableSolvers at once, in lock step passes over padded NumPy arrays
+	of group x table x role, instead of one swap at a time through score_table. Follows
+	HillClimb: random swaps of two movable units are kept if they lower the score of the
+	two tables, and a group stops after max_fails failed swaps in a row, as in HillClimb. Each pass draws candidates swaps for every group still
+	running and keeps the first that helps, which is the same as trying them one after
+	another. Tables are scored from their totals by score_totals. The solvers need
+	their initial seating and the same number of roles."""
+	#smallest drop in score counted as an improvement, above rounding noise in the totals
+	EPSILON = 1e-9
+
+	def __init__(self, solvers, deadline=None, rng=None, max_fails=None, candidates=16):
+		self.solvers = solvers
+		self.deadline = deadline
+		self.rng = rng if rng is not None else Random()
+		self.max_fails = max_fails
+		self.candidates = candidates
+
+	def pack(self):
+		"""Build the unit and table arrays. Units past a group's own count, and units left
+		at seating -1, sit at table index num_tables, which is never scored or chosen."""
+		solvers = self.solvers
+		num = len(solvers)
+		self.num_tables = max([s.need_tables for s in solvers])
+		self.num_units = max([len(s.seating) for s in solvers])
+		width = ROLES + solvers[0].num_roles
+		bin_table = self.num_tables
+		self.units = np.zeros((num, self.num_units, width))
+		self.seating = np.full((num, self.num_units), bin_table)
+		self.anchors = np.array([s.need_tables for s in solvers])
+		self.movable = np.array([len(s.seating) - s.need_tables for s in solvers])
+		self.seats = np.array([s.seats_per_table for s in solvers])
+		self.min_players = np.array([s.table_group._game_system.min_players for s in solvers])
+		self.fail_limit = np.array([HillClimb(self.max_fails).fail_limit(len(s.seating)) for s in solvers])
+		for gi in range(0, num):
+			s = solvers[gi]
+			members = [p for grp in s.assignable for p in grp]
+			owner = [u for u in range(0, len(s.assignable)) for p in s.assignable[u]]
+			np.add.at(self.units[gi], owner, s.player_totals()[members])
+			seating = np.array(s.seating)
+			self.seating[gi, :len(seating)] = np.where(seating < 0, bin_table, seating)
+		self.tables = np.zeros((num, self.num_tables + 1, width))
+		rows = np.repeat(np.arange(0, num), self.num_units)
+		np.add.at(self.tables, (rows, self.seating.ravel()), self.units.reshape(-1, width))
+
+	def optimize(self):
+		"""Hill climb every group, then hand the seatings back to the solvers, with their
+		score, stopped_early and the counts HillClimb would record."""
+		self.pack()
+		num = len(self.solvers)
+		bin_table = self.num_tables
+		rng = np.random.default_rng(self.rng.getrandbits(64))
+		scores = score_totals(self.tables, self.seats[:, None], self.min_players[:, None])
+		scores[:, bin_table] = 0.0
+		draws = np.arange(0, self.candidates)
+		fails = np.zeros(num, dtype=int)
+		iterations = np.zeros(num, dtype=int)
+		attempts = np.zeros(num, dtype=int)
+		accepts = np.zeros(num, dtype=int)
+		converged_at = np.zeros(num, dtype=int)
+		stopped = np.zeros(num, dtype=bool)
+		active = self.movable > 0
+		while True:
+			idx = np.flatnonzero(active)
+			if not len(idx): break
+			if self.deadline is not None and monotonic() >= self.deadline:
+				stopped[idx] = True
+				break
+			rows = idx[:, None]
+			picks = rng.random((2, len(idx), self.candidates))
+			u1 = self.anchors[rows] + (picks[0] * self.movable[rows]).astype(int)
+			u2 = self.anchors[rows] + (picks[1] * self.movable[rows]).astype(int)
+			t1 = self.seating[rows, u1]
+			t2 = self.seating[rows, u2]
+			#draws past a group's remaining failures are never looked at
+			budget = draws < (self.fail_limit[idx] - fails[idx])[:, None]
+			valid = (t1 != t2) & (t1 != bin_table) & (t2 != bin_table) & budget
+			change = self.units[rows, u2] - self.units[rows, u1]
+			new1 = self.tables[rows, t1] + change
+			new2 = self.tables[rows, t2] - change
+			seats = self.seats[rows]
+			min_players = self.min_players[rows]
+			gain = scores[rows, t1] + scores[rows, t2] - score_totals(new1, seats, min_players) - \
+				score_totals(new2, seats, min_players)
+			better = valid & (gain > self.EPSILON)
+			found = better.any(axis=1)
+			first = better.argmax(axis=1)
+			used = np.where(found, first + 1, budget.sum(axis=1))
+			iterations[idx] += used
+			attempts[idx] += (valid & (draws < used[:, None])).sum(axis=1)
+			fails[idx] = np.where(found, 0, fails[idx] + used)
+			if found.any():
+				g = idx[found]
+				k = first[found]
+				(b1, b2) = (t1[found, k], t2[found, k])
+				self.tables[g, b1] = new1[found, k]
+				self.tables[g, b2] = new2[found, k]
+				scores[g, b1] = score_totals(self.tables[g, b1], self.seats[g], self.min_players[g])
+				scores[g, b2] = score_totals(self.tables[g, b2], self.seats[g], self.min_players[g])
+				self.seating[g, u1[found, k]] = b2
+				self.seating[g, u2[found, k]] = b1
+				accepts[g] += 1
+				converged_at[g] = iterations[g]
+			active[idx] = fails[idx] < self.fail_limit[idx]
+		for gi in range(0, num):
+			s = self.solvers[gi]
+			seating = self.seating[gi, :len(s.seating)].tolist()
+			s.seating = [t if t != bin_table else -1 for t in seating]
+			s.stopped_early = bool(stopped[gi])
+			s.iterations = int(iterations[gi])
+			s.attempts = int(attempts[gi])
+			s.accepts = int(accepts[gi])
+			s.converged_at = int(converged_at[gi])
+			s.index_tables()
+			s.score = s.total_score()
+
+class FreeLocations:
+	'''Pool of idle locations, handing out the lowest numbered one first. A set answers
+	membership, while a heap, cleaned up lazily, finds the lowest idle location.'''
+	def __init__(self):
+		self.idle = set()
+		self.heap = []
+
+	def __contains__(self, location):
+		return location in self.idle
+
+	def __len__(self):
+		return len(self.idle)
+
+	def release(self, location):
+		if location in self.idle: return
+		self.idle.add(location)
+		heappush(self.heap, location)
+
+	def take(self, location):
+		self.idle.remove(location)
+
+	def take_lowest(self):
+		while True:
+			location = heappop(self.heap)
+			if location in self.idle:
+				self.idle.remove(location)
+				return location
 
 class LocationManager:
 	'''Class to organize the machinery of assigning table numbers. Call book_tables instead.'''
 	def __init__(self, tables):
 		self.affinity_by_table = {}
 		self.affinity_by_gm = {}
-		self.idle = []
+		self.idle = FreeLocations()
 		self.used = 0
 		self.tables = tables 
 		self.events = []
@@ -422,7 +1486,7 @@ class LocationManager:
 			t = tables[i]
 			self.events.append(('S', t.start_time, i))
 			self.events.append(('E', t.end_time, i))
-		self.events.sort(key=lambda x: str(x[1]) + x[0])
+		self.events.sort(key=lambda x: (x[1], x[0]))
 
 	def table_affinity(self,gm):
 		tab_gm = None
@@ -437,7 +1501,15 @@ class LocationManager:
 
 	def assign_group(self,heat):
 		rnd2 = []
+		unpinned = []
 		for h in heat:
+			table = self.tables[h[2]]
+			location = getattr(table, 'location', None)
+			if location is not None and self.claim(location):
+				if table.gm: self.update_affinity(table.gm.name, location)
+			else:
+				unpinned.append(h)
+		for h in unpinned:
 			table = self.tables[h[2]]
 			gm = table.gm 
 			if not gm:
@@ -445,15 +1517,14 @@ class LocationManager:
 				continue
 			location = self.table_affinity(gm.name)
 			if location and location in self.idle:
-				self.idle.remove(location)
+				self.idle.take(location)
 				table.location = location
 			else:
 				rnd2.append(h)
 		for h in rnd2:
 			table = self.tables[h[2]]
 			if self.idle:
-				location = min(self.idle)
-				self.idle.remove(location)
+				location = self.idle.take_lowest()
 			else:
 				self.used += 1
 				location = self.used
@@ -461,26 +1532,40 @@ class LocationManager:
 			if table.gm:
 				self.update_affinity(table.gm.name, table.location)
 
+	def claim(self, location):
+		'''Take a particular location, if it is not in use.'''
+		if location in self.idle:
+			self.idle.take(location)
+			return True
+		if location > self.used:
+			for x in range(self.used + 1, location):
+				self.idle.release(x)
+			self.used = location
+			return True
+		return False
+
 	def release_group(self,heat):
 		for h in heat:
 			location = self.tables[h[2]].location
-			self.idle.append(location)
+			self.idle.release(location)
 
 	def set_locations(self):
-		events = []
-		for i in range(0,len(self.tables)):
-			t = self.tables[i]
-			events.append(('S', t.start_time, i))
-			events.append(('E', t.end_time, i))
-		gropued_events = group_by(events,
-			grouping=lambda x:x[0],
-			sorting=lambda x:str(x[1]) + x[0])
-		for group in gropued_events:
-			if group[0][0] == 'S':
-				self.assign_group(group)
+		'''Walk the time sorted events, assigning locations to each run of starting
+		tables and releasing them for each run of ending tables.'''
+		for (kind, group) in groupby(self.events, key=lambda x:x[0]):
+			if kind == 'S':
+				self.assign_group(list(group))
 			else:
 				self.release_group(group)
 
+def collect_seating(seating, tables, waitlists, messages):
+	'''Sort the output of TableGroup.seat_players into lists of TableAssignments, WaitLists
+	and messages, appending to each in place.'''
+	for x in seating:
+		if isinstance(x, TableAssignment): tables.append(x)
+		elif isinstance(x, WaitList): waitlists.append(x)
+		else: messages.extend(x)
+
 def daily_schedule(tables):
 	time_slots = group_by(tables,
 		grouping=lambda x:x.start_time,
@@ -488,28 +1573,161 @@ def daily_schedule(tables):
 	for slot in time_slots:
 		slot.sort(key=lambda x:x.event)
 	daily = group_by(time_slots,
-		grouping=lambda x:x[0].start_time.strftime('%Y%j') ,
-		sorting=lambda x:1)
+		grouping=lambda x:x[0].start_time.strftime('%Y%j'),
+		sorting=None)
 	return daily
 
-def seat_table_groups(tgroups):
+def batch_seat(tgroups, seeds, deadline=None, rng=None, telemetry=None, max_tables=4):
+	'''Balance the TableGroups that can be batched, see TableGroup.batchable, with a
+	BatchSolver for each number of roles. Their seatings are kept for seat_players to use.
+	Returns the indexes into tgroups of the groups batched.'''
+	batches = {}
+	batched = []
+	for i in range(0, len(tgroups)):
+		g = tgroups[i]
+		if not g.batchable(max_tables): continue
+		ts = TableSolver(g, deadline=deadline, rng=Random(seeds[i]), telemetry=telemetry)
+		with timed_phase(telemetry, 'initial_seating'):
+			ts.initial_seating()
+		batches.setdefault(ts.num_roles, []).append(ts)
+		batched.append(i)
+	for solvers in batches.values():
+		with timed_phase(telemetry, 'batch_swaps'):
+			BatchSolver(solvers, deadline=deadline, rng=rng).optimize()
+		for ts in solvers:
+			ts.table_group.presolved = (ts.score, ts.stopped_early, ts.table_indexes(), None)
+			if telemetry is not None: telemetry.solver_run(ts)
+	return batched
+
+def _seat_group(job):
+	'''Seat one TableGroup, possibly in a worker process. Returns the seating along
+	with the group state that a worker process would otherwise lose.'''
+	(g, deadline, group_seed, record) = job
+	telemetry = Telemetry() if record else None
+	seating = g.seat_players(deadline, Random(group_seed), telemetry)
+	return (seating, g.score, g.stopped_early, g.reused, telemetry, g.seating_indexes)
+
+def _id_key(tid):
+	return json.dumps(tid, sort_keys=True, default=str)
+
+def previous_tables(previous):
+	'''Group the TableAssignments of a previous seat_table_groups result, or the tables of
+	its JSON form, by TableGroup id, as records of sub_id, game master, players and location.'''
+	tables = previous['tables'] if isinstance(previous, dict) else previous
+	by_id = {}
+	for t in tables:
+		if isinstance(t, dict):
+			rec = (t.get('id', None), t.get('sub_id', None), t.get('gm', None), t.get('players', []),
+				t.get('location', None))
+		else:
+			rec = (t.id, t.sub_id, t.gm, t.players, getattr(t, 'location', None))
+		if rec[0] is None: continue
+		by_id.setdefault(_id_key(rec[0]), []).append({
+			'sub_id' : rec[1],
+			'gm' : player_key(rec[2]) if rec[2] else None,
+			'players' : [player_key(p) for p in rec[3]],
+			'location' : rec[4]
+		})
+	for recs in by_id.values():
+		recs.sort(key=lambda x:x['sub_id'])
+	return by_id
+
+def seat_table_groups(tgroups, time_budget=None, workers=None, executor=None, seed=None, previous=None,
+		progress=None, telemetry=None, batch_tables=None):
+	'''Muster one or more TableGroups. If time_budget is given, balancing of all groups
+	together stops after that many seconds, using the best seatings found so far.
+	TableGroups are independent, so they can be seated in parallel by passing a number
+	of worker processes, or a concurrent.futures executor to use. Passing seed makes
+	the seating reproducible, whether or not it runs in parallel.
+	Given the result of a previous muster, or its JSON form, as previous, TableGroups
+	whose seated players and game masters have not changed keep their old seating,
+	the rest are balanced starting from it, and tables keep their old locations
+	where possible. progress, if given, is called with the number of groups seated so
+	far and the total number of groups as seating proceeds. Timings and solver
+	statistics are recorded in telemetry, a Telemetry, if one is given. Given batch_tables,
+	small groups of up to that many tables are balanced together by a BatchSolver,
+	while the rest are seated as usual. A group with the same roster_key as an earlier
+	one, such as a party signing up for a scenario run in several slots, is given that
+	group's seating rather than being balanced again.'''
 	if not isinstance(tgroups, list):
 		tgroups = [tgroups]
+	if previous is not None:
+		prev = previous_tables(previous)
+		for g in tgroups:
+			g.previous_tables = prev.get(_id_key(g.id), None) if g.id is not None else None
 
-	output = []	
-	for g in tgroups:		
-		output = output + g.seat_players()
+	deadline = None
+	if time_budget is not None: deadline = monotonic() + time_budget
+	parallel = executor is not None or (workers or 1) > 1
+	rnd = Random(seed)
+	seeds = [rnd.getrandbits(64) for g in tgroups]
+	jobs = [(tgroups[i], deadline, seeds[i], telemetry is not None) for i in range(0, len(tgroups))]
+	batched = set()
+	if batch_tables:
+		with timed_phase(telemetry, 'seating'):
+			batched = set(batch_seat(tgroups, seeds, deadline, Random(rnd.getrandbits(64)),
+				telemetry, batch_tables))
+	order = [i for i in range(0, len(jobs)) if i not in batched]
+	#a group with the same roster as one before it takes that group's seating
+	first = {}
+	repeats = {}
+	for i in order:
+		key = tgroups[i].roster_key()
+		if key is None: continue
+		if key in first: repeats[i] = first[key]
+		else: first[key] = i
+	order = [i for i in order if i not in repeats]
+	solo = [jobs[i] for i in order]
+	pool = None
+	if not parallel:
+		seated = map(_seat_group, solo)
+	elif executor is not None:
+		seated = executor.map(_seat_group, solo)
+	else:
+		from concurrent.futures import ProcessPoolExecutor
+		pool = ProcessPoolExecutor(max_workers=workers)
+		seated = pool.map(_seat_group, solo, chunksize=max(1, len(solo) // (4 * workers)))
+	results = [None] * len(jobs)
+	done = 0
+	try:
+		with timed_phase(telemetry, 'seating'):
+			if progress: progress(0, len(jobs))
+			#batched groups only need their tables built, so are quick to finish here
+			for i in sorted(batched):
+				results[i] = _seat_group(jobs[i])
+				done += 1
+				if progress: progress(done, len(jobs))
+			for (i, r) in zip(order, seated):
+				results[i] = r
+				done += 1
+				if progress: progress(done, len(jobs))
+			for i in sorted(repeats):
+				(score, stopped_early, indexes) = [results[repeats[i]][x] for x in (1, 2, 5)]
+				tgroups[i].presolved = (score, stopped_early, indexes, None)
+				results[i] = _seat_group(jobs[i])
+				done += 1
+				if progress: progress(done, len(jobs))
+	finally:
+		if pool is not None: pool.shutdown()
 
-	tables = list(filter(lambda x:isinstance(x, TableAssignment), output))
-	waitlists = list(filter(lambda x:isinstance(x, WaitList), output))
-	messages = reduce(lambda x,y: x+y, list(filter(lambda x:isinstance(x, list), output)))
+	tables = []
+	waitlists = []
+	messages = []
+	for (g, (seating, score, stopped_early, reused, group_telemetry, indexes)) in zip(tgroups, results):
+		g.score = score
+		g.stopped_early = stopped_early
+		g.reused = reused
+		collect_seating(seating, tables, waitlists, messages)
+		if telemetry is not None: telemetry.merge(group_telemetry)
 	messages.sort(key=lambda x:x[1])
 	messages = [x[0] for x in messages]
               
-	lm = LocationManager(tables)
-	lm.set_locations()
+	with timed_phase(telemetry, 'locations'):
+		lm = LocationManager(tables)
+		lm.set_locations()
 
-	schedule = daily_schedule(tables+waitlists)
+	with timed_phase(telemetry, 'schedule'):
+		schedule = daily_schedule(tables+waitlists)
 
 	return {
 		'tables' : tables,
@@ -517,6 +1735,8 @@ def seat_table_groups(tgroups):
 		'messages' : messages,
 		'schedule' : schedule,
 		'locations_needed' : lm.used,
+		'stopped_early' : any([g.stopped_early for g in tgroups]),
+		'telemetry' : telemetry.as_dict() if telemetry is not None else None
 	}
 
 
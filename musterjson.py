@@ -0,0 +1,149 @@
+#Serializes the result of seat_table_groups to JSON or newline delimited JSON, a piece at
+#a time, without building as_dict() for every table, waitlist and player first. The
+#default JSON is byte for byte what Flask's jsonify makes of the as_dict() form.
+#
+#In the compact form players are written once, in a players list, and tables and
+#waitlists hold indexes into it, with gm an index or null. Players with the same name,
+#team and id share an entry.
+#
+#As newline delimited JSON, the first line holds locations_needed, messages and
+#stopped_early, followed by a line for each table and waitlist, as {"table":{...}} and
+#{"waitlist":{...}}. In the compact form each player is written as a {"player":{...}}
+#line before the first table or waitlist using it, and is numbered in order from 0.
+
+import json
+from json.encoder import encode_basestring_ascii
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
+#pieces are gathered into chunks of about this many characters
+CHUNK_SIZE = 1 << 16
+
+_encode = json.JSONEncoder(ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode
+
+def _value(x):
+	'''x as JSON, skipping the encoder's overhead for the usual strings, ints and nulls.'''
+	if x is None: return 'null'
+	if type(x) is str: return encode_basestring_ascii(x)
+	if type(x) is int: return int.__repr__(x)
+	return _encode(x)
+
+class _Writer:
+	'''Encodes tables, waitlists and players, formatting each distinct time only once
+	and, in the compact form, numbering each distinct player.'''
+	def __init__(self, compact):
+		self.compact = compact
+		self.times = {}
+		self.players = {}
+		self.order = []
+
+	def time(self, when):
+		#equal datetimes in different time zones format differently
+		key = (when, when.utcoffset())
+		out = self.times.get(key, None)
+		if out is None:
+			out = _encode(when.strftime(TIME_FORMAT))
+			self.times[key] = out
+		return out
+
+	def player(self, p):
+		'''The player encoded as JSON, or in the compact form its index, adding it to
+		self.players as it is first seen.'''
+		out = '{"id":%s,"name":%s,"team":%s}' % (_value(p.id), _value(p.name), _value(p.team))
+		if not self.compact: return out
+		index = self.players.get(out, None)
+		if index is None:
+			index = len(self.players)
+			self.players[out] = index
+			self.order.append(out)
+		return str(index)
+
+	def player_list(self, players):
+		return '[' + ','.join([self.player(x) for x in players]) + ']'
+
+	def table(self, t):
+		return ('{"end_time":%s,"gm":%s,"id":%s,"location":%s,"pass_through":%s,"players":%s,'
+			'"refname":%s,"seats":%s,"start_time":%s,"sub_id":%s}') % (
+			self.time(t.end_time), self.player(t.gm) if t.gm else 'null', _value(t.id),
+			_value(t.location), _encode(t.pass_through), self.player_list(t.players),
+			_value(t.refname), _value(t.seats), self.time(t.start_time), _value(t.sub_id))
+
+	def waitlist(self, w):
+		return '{"end_time":%s,"id":%s,"pass_through":%s,"players":%s,"start_time":%s}' % (
+			self.time(w.end_time), _value(w.id), _encode(w.pass_through),
+			self.player_list(w.players), self.time(w.start_time))
+
+	def new_players(self, seen):
+		'''Players added since the first seen were written.'''
+		return self.order[seen:]
+
+def _chunked(pieces):
+	buf = []
+	size = 0
+	for piece in pieces:
+		buf.append(piece)
+		size += len(piece)
+		if size >= CHUNK_SIZE:
+			yield ''.join(buf)
+			buf = []
+			size = 0
+	if buf: yield ''.join(buf)
+
+def _header(data, extra):
+	fields = {
+		'locations_needed' : data['locations_needed'],
+		'messages' : data['messages'],
+		'stopped_early' : data['stopped_early']
+	}
+	if extra: fields.update(extra)
+	return fields
+
+def _json_pieces(data, compact, extra):
+	writer = _Writer(compact)
+	lists = {
+		'tables' : [writer.table(x) for x in data['tables']] if compact else (writer.table, data['tables']),
+		'waitlists' : [writer.waitlist(x) for x in data['waitlists']] if compact else (writer.waitlist, data['waitlists'])
+	}
+	#in the compact form the players list comes before the tables, so they are
+	#encoded first to find every player
+	if compact: lists['players'] = writer.new_players(0)
+	fields = _header(data, extra)
+	keys = sorted(list(fields.keys()) + list(lists.keys()))
+	yield '{'
+	for (i, k) in enumerate(keys):
+		if i > 0: yield ','
+		yield _encode(k) + ':'
+		if k not in lists:
+			yield _encode(fields[k])
+			continue
+		items = lists[k]
+		yield '['
+		if isinstance(items, list):
+			yield ','.join(items)
+		else:
+			(encode, objs) = items
+			for (j, x) in enumerate(objs):
+				yield (',' if j > 0 else '') + encode(x)
+		yield ']'
+	yield '}\n'
+
+def _ndjson_pieces(data, compact, extra):
+	writer = _Writer(compact)
+	yield _encode(_header(data, extra)) + '\n'
+	for (kind, encode, objs) in [('table', writer.table, data['tables']),
+			('waitlist', writer.waitlist, data['waitlists'])]:
+		for x in objs:
+			seen = len(writer.order)
+			line = '{"%s":%s}\n' % (kind, encode(x))
+			for p in writer.new_players(seen):
+				yield '{"player":%s}\n' % p
+			yield line
+
+def muster_chunks(data, compact=False, ndjson=False, extra=None):
+	'''Yield the result of seat_table_groups, data, as JSON text in chunks. extra is a
+	dictionary of further top level fields, such as telemetry.'''
+	pieces = _ndjson_pieces if ndjson else _json_pieces
+	return _chunked(pieces(data, compact, extra))
+
+def muster_dumps(data, compact=False, ndjson=False, extra=None):
+	'''The result of seat_table_groups, data, as JSON bytes.'''
+	return ''.join(muster_chunks(data, compact, ndjson, extra)).encode('ascii')
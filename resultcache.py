@@ -0,0 +1,119 @@
+#Content addressed cache for mustering results. Results are stored as serialized bytes,
+#keyed by a hash of everything that determines them, so a repeated request can be
+#answered with exactly the same response without mustering again.
+
+from collections import OrderedDict
+from hashlib import sha256
+import json
+import os
+from tempfile import mkstemp
+from threading import Lock
+
+def canonical_key(*parts):
+	'''A hex digest of JSON serializable parts, independent of dictionary ordering.'''
+	h = sha256()
+	for part in parts:
+		h.update(json.dumps(part, sort_keys=True, separators=(',', ':'), default=str).encode('utf8'))
+		h.update(b'\0')
+	return h.hexdigest()
+
+class ResultCache:
+	'''In memory LRU cache of byte strings, evicting least recently used entries once
+	they total more than max_bytes. If a directory is given, entries are also written
+	there and survive restarts, with the oldest files removed once they total more
+	than disk_max_bytes. Safe to share between threads.'''
+	def __init__(self, max_bytes=64 << 20, directory=None, disk_max_bytes=1 << 30):
+		self.max_bytes = max_bytes
+		self.directory = directory
+		self.disk_max_bytes = disk_max_bytes
+		self.entries = OrderedDict()
+		self.size = 0
+		self.hits = 0
+		self.disk_hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.lock = Lock()
+		if directory: os.makedirs(directory, exist_ok=True)
+
+	def _path(self, key):
+		return os.path.join(self.directory, key + '.cache')
+
+	def get(self, key):
+		with self.lock:
+			value = self.entries.get(key, None)
+			if value is not None:
+				self.entries.move_to_end(key)
+				self.hits += 1
+				return value
+		if self.directory:
+			try:
+				with open(self._path(key), 'rb') as fin:
+					value = fin.read()
+			except OSError:
+				value = None
+			if value is not None:
+				with self.lock:
+					self.disk_hits += 1
+				self._remember(key, value)
+				return value
+		with self.lock:
+			self.misses += 1
+		return None
+
+	def put(self, key, value):
+		self._remember(key, value)
+		if self.directory:
+			#a file of its own, as other threads and processes may be storing the same key
+			(fd, tmp) = mkstemp(suffix='.tmp', dir=self.directory)
+			try:
+				with os.fdopen(fd, 'wb') as fout:
+					fout.write(value)
+				os.replace(tmp, self._path(key))
+			except BaseException:
+				os.unlink(tmp)
+				raise
+			self._trim_disk()
+
+	def _remember(self, key, value):
+		with self.lock:
+			if key in self.entries:
+				self.size -= len(self.entries.pop(key))
+			if len(value) > self.max_bytes: return
+			self.entries[key] = value
+			self.size += len(value)
+			while self.size > self.max_bytes:
+				(old, old_value) = self.entries.popitem(last=False)
+				self.size -= len(old_value)
+				self.evictions += 1
+
+	def _trim_disk(self):
+		files = []
+		for x in os.scandir(self.directory):
+			if not x.name.endswith('.cache'): continue
+			#other threads and processes may remove files as we go
+			try:
+				st = x.stat()
+			except OSError:
+				continue
+			files.append((st.st_mtime, st.st_size, x.path))
+		total = sum([x[1] for x in files])
+		if total <= self.disk_max_bytes: return
+		files.sort()
+		for (mtime, size, path) in files:
+			if total <= self.disk_max_bytes: break
+			total -= size
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+
+	def stats(self):
+		with self.lock:
+			return {
+				'entries' : len(self.entries),
+				'bytes' : self.size,
+				'hits' : self.hits,
+				'disk_hits' : self.disk_hits,
+				'misses' : self.misses,
+				'evictions' : self.evictions
+			}
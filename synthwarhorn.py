@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+
+#Generates synthetic events in the format of a Warhorn export, for benchmarking and for
+#trying out changes without real signup data. The same seed always gives the same event.
+#
+#Usage: ./synthwarhorn.py <<signups>> [seed] > event.json
+
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from random import Random
+
+#game system, campaign, table size, scenario code, organized play network and classes,
+#for each kind of game generated
+GAMES = [
+	('Dungeons & Dragons 5th Edition', 'D&D Adventurers League', 7, 'DDAL', 'DCI',
+		['Barbarian', 'Bard', 'Cleric', 'Druid', 'Fighter', 'Monk', 'Paladin', 'Ranger',
+		'Rogue', 'Sorcerer', 'Warlock', 'Wizard']),
+	('Pathfinder 1st Edition', 'Pathfinder Society (1st edition)', 6, 'PFS', 'Pathfinder Society',
+		['Barbarian', 'Bard', 'Cleric', 'Druid', 'Fighter', 'Monk', 'Paladin', 'Ranger',
+		'Rogue', 'Sorcerer', 'Wizard']),
+	('Pathfinder 2nd Edition', 'Pathfinder Society (2nd edition)', 6, 'PFS2', 'Pathfinder Society',
+		['Alchemist', 'Barbarian', 'Bard', 'Cleric', 'Druid', 'Fighter', 'Monk', 'Paladin',
+		'Ranger', 'Rogue', 'Sorcerer', 'Wizard']),
+	('Starfinder', 'Starfinder Society', 6, 'SFS', 'Pathfinder Society',
+		['Envoy', 'Mechanic', 'Mystic', 'Operative', 'Solarian', 'Soldier', 'Technomancer']),
+	('Pathfinder Adventure Card Game', 'Pathfinder Adventure Card Society', 4, 'PACS', 'Pathfinder Society',
+		['Cleric', 'Fighter', 'Rogue', 'Wizard'])
+]
+GAME_WEIGHTS = [5, 2, 4, 2, 1]
+
+FIRST_NAMES = ['Alex', 'Avery', 'Blake', 'Casey', 'Charlie', 'Dakota', 'Drew', 'Emerson',
+	'Finley', 'Harper', 'Hayden', 'Jamie', 'Jordan', 'Kai', 'Kendall', 'Logan', 'Morgan',
+	'Parker', 'Peyton', 'Quinn', 'Reese', 'Riley', 'Rowan', 'Sage', 'Sam', 'Skyler',
+	'Taylor', 'Tatum', 'Jesse', 'Robin']
+LAST_NAMES = ['Adams', 'Baker', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Hughes',
+	'Ito', 'Jones', 'Kim', 'Lopez', 'Martin', 'Nguyen', "O'Brien", 'Patel', 'Quinn', 'Rossi',
+	'Smith', 'Tanaka', 'Usman', 'Varga', 'Walker', 'Xu', 'Young', 'Zimmer']
+#surnames are a last name, possibly with a second joined on, so that most players
+#have a surname of their own and shared surnames mostly mean a household
+SURNAMES = LAST_NAMES + ['%s-%s' % (x, y) for x in LAST_NAMES for y in LAST_NAMES if x != y]
+TEAMS = ['Dragonslayers', 'Lodge', 'Night Owls', 'Gamers Guild', 'Red Wizards', 'Pathfinders']
+
+SLOT_STARTS = [8, 13, 19]
+SLOT_HOURS = 4
+
+class _Event:
+	'''Builds one synthetic event. People, including game masters, are drawn from a
+	shared pool, so the same names sign up across slots as they would at a convention.'''
+	def __init__(self, signups, rng, venues, days):
+		self.rng = rng
+		self.signups = signups
+		self.venues = venues
+		self.days = days
+		self.tz = timezone(timedelta(hours=-5))
+		self.opens = datetime(2019, 6, 1, 9, 0, tzinfo=self.tz)
+		self.people = []
+		self.households = []
+		while len(self.people) < max(10, signups // 3):
+			self.household()
+		self.gms = self.rng.sample(self.people, max(2, len(self.people) // 8))
+
+	def household(self):
+		'''Add a household of people sharing a surname, usually just one person.'''
+		rng = self.rng
+		last = rng.choice(SURNAMES)
+		size = rng.choices([1, 2, 3, 4], [85, 9, 4, 2])[0]
+		members = []
+		for i in range(0, size):
+			who = self.person(len(self.people), last)
+			who['household'] = len(self.households)
+			self.people.append(who)
+			members.append(who)
+		self.households.append(members)
+
+	def person(self, i, last):
+		rng = self.rng
+		first = rng.choice(FIRST_NAMES)
+		name = '%s %s' % (first, last)
+		r = rng.random()
+		if r < 0.08: name += ' #%s' % rng.choice(TEAMS)
+		elif r < 0.12: name += ' (%s)' % rng.choice(TEAMS)
+		elif r < 0.14: name += ' [%s]' % rng.choice(TEAMS)
+		return {
+			'name' : name,
+			'email' : '%s.%s%d@example.org' % (first.lower(), last.lower().replace("'", ''), i),
+			'numbers' : dict([(x, str(1000000 + i)) for x in set([g[4] for g in GAMES])])
+		}
+
+	def character(self, classes):
+		rng = self.rng
+		r = rng.random()
+		if r < 0.15: return None
+		if r < 0.2: return {'classes' : []}
+		multiclass = 2 if rng.random() < 0.1 else 1
+		level = rng.randint(1, 11)
+		chosen = []
+		for i in range(0, multiclass):
+			if rng.random() < 0.05:
+				chosen.append('?')
+			elif rng.random() < 0.1:
+				chosen.append(rng.choice(classes))
+			else:
+				chosen.append('%s %d' % (rng.choice(classes), max(1, level // multiclass)))
+		return {'classes' : chosen}
+
+	def signup(self, who, network, classes, starts):
+		entry = {
+			'name' : who['name'],
+			'email' : who['email'],
+			'signed_up_at' : (starts - timedelta(minutes=self.rng.randint(60, 60 * 24 * 60))).isoformat(),
+			'organized_play_memberships' : [{'network' : network, 'member_number' : who['numbers'][network]}]
+		}
+		if classes is not None:
+			character = self.character(classes)
+			if character is not None: entry['character'] = character
+		return entry
+
+	def session(self, uuid, starts, players):
+		rng = self.rng
+		(gsystem, campaign, size, code, network, classes) = rng.choices(GAMES, GAME_WEIGHTS)[0]
+		tables = max(1, round(players / size))
+		low = rng.randint(1, 10)
+		gms = tables - (1 if tables > 1 and rng.random() < 0.15 else 0)
+		return {
+			'uuid' : uuid,
+			'table_count' : tables,
+			'table_size' : size,
+			'scenario' : {
+				'name' : '%s %d-%02d' % (code, rng.randint(1, 12), rng.randint(1, 20)),
+				'blurb' : '',
+				'game_system' : gsystem,
+				'campaign' : campaign,
+				'min_level' : low,
+				'max_level' : low + 4
+			},
+			'gms' : [self.signup(x, network, None, starts) for x in rng.sample(self.gms, min(gms, len(self.gms)))],
+			'players' : [self.signup(x, network, classes, starts) for x in self.attendees(players)]
+		}
+
+	def attendees(self, count):
+		'''count people, where those in a household usually bring the rest of it along.'''
+		chosen = []
+		seen = set()
+		while len(chosen) < count and len(seen) < len(self.people):
+			who = self.rng.choice(self.people)
+			group = self.households[who['household']] if self.rng.random() < 0.7 else [who]
+			for x in group:
+				if id(x) in seen or len(chosen) >= count: continue
+				seen.add(id(x))
+				chosen.append(x)
+		return chosen
+
+	def admin_session(self, uuid, starts):
+		'''A signup for volunteers, with a table size no game system accepts.'''
+		(gsystem, campaign, size, code, network, classes) = GAMES[0]
+		return {
+			'uuid' : uuid,
+			'table_count' : 1,
+			'table_size' : 1,
+			'scenario' : {
+				'name' : 'Volunteer Headquarters',
+				'blurb' : '',
+				'game_system' : gsystem,
+				'campaign' : campaign,
+				'min_level' : 1,
+				'max_level' : 20
+			},
+			'gms' : [],
+			'players' : [self.signup(x, network, None, starts) for x in self.rng.sample(self.people, 4)]
+		}
+
+	def slots(self):
+		rng = self.rng
+		slots = []
+		for v in range(0, self.venues):
+			for d in range(0, self.days):
+				for hour in SLOT_STARTS:
+					starts = self.opens + timedelta(days=30 + d, hours=hour - 9)
+					slots.append({
+						'uuid' : 'slot-%d-%d-%d' % (v, d, hour),
+						'venue' : 'Venue %d' % (v + 1),
+						'starts_at' : starts.isoformat(),
+						'ends_at' : (starts + timedelta(hours=SLOT_HOURS)).isoformat(),
+						'sessions' : []
+					})
+		left = self.signups
+		n = 0
+		while left > 0:
+			slot = slots[n % len(slots)]
+			starts = datetime.fromisoformat(slot['starts_at'])
+			uuid = 'session-%d' % n
+			if n < len(slots) and n % 7 == 3:
+				session = self.admin_session(uuid, starts)
+			else:
+				players = min(left, int(rng.triangular(3, 60, 20)))
+				session = self.session(uuid, starts, players)
+			slot['sessions'].append(session)
+			left -= len(session['players']) + len(session['gms'])
+			n += 1
+		return [x for x in slots if x['sessions']]
+
+def synthetic_event(signups, seed=0, venues=None, days=3):
+	'''A Warhorn style export, as a dictionary with a single slots field, holding about
+	signups player and game master signups spread over venues and days of three slots
+	each. By default there is one venue for every 10000 signups.'''
+	if venues is None: venues = max(1, min(5, signups // 10000 + 1))
+	return {'slots' : _Event(signups, Random(seed), venues, days).slots()}
+
+def main():
+	signups = int(sys.argv[1])
+	seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+	json.dump(synthetic_event(signups, seed), sys.stdout)
+
+if __name__ == '__main__':
+	main()
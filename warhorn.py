@@ -1,8 +1,12 @@
 from datetime import datetime
 from copy import copy
+from functools import lru_cache
+import json
+import os
 import re
+import tempfile
 
-from mustard import Player, TableGroup
+from mustard import Player, TableGroup, check_game_systems
 
 warhorn_campaign = {
 	"D&D Adventurers League" : "DCI",
@@ -16,13 +20,22 @@ warhorn_campaign = {
 TS_FMT = "%Y-%m-%dT%H:%M:%S%z"
 ROLE_REGEX = re.compile("([\w|\?]+)( \d+)?")
 
+STRIP_TABLE = str.maketrans('', '', "'()[]#")
+
 def strip_chrs(st):
-	nst = ''
-	for c in st:
-		if c == "'" or c == "(" or c == ')' or c == '[' or c == ']' or c == '#':
-			continue
-		nst = nst + c 
-	return nst.strip()
+	return st.translate(STRIP_TABLE).strip()
+
+@lru_cache(maxsize=1 << 16)
+def parse_timestamp(ts):
+	'''datetime.strptime(ts, TS_FMT), with a fast path for the usual Warhorn format
+	of YYYY-MM-DDTHH:MM:SS followed by Z, +HHMM or +HH:MM. Timestamps repeat a lot
+	within an export, so results are cached.'''
+	if len(ts) in (20, 24, 25) and ts[10] == 'T' and ts[19] in '+-Z':
+		try:
+			return datetime.fromisoformat(ts)
+		except ValueError:
+			pass
+	return datetime.strptime(ts, TS_FMT)
 
 def parse_name(name):
 	team = None
@@ -45,19 +58,24 @@ def parse_name(name):
 		team = '__remove__%s' % family
 	return (name, team)
 	
+class WarhornPlayer(Player):
+	__slots__ = ('print_team', 'signup_at', 'email', 'number', 'role', 'roles', 'level')
+
 def warhorn_player(p, network):
-	player = Player()
+	player = WarhornPlayer()
 	(player.name, player.team) = parse_name(p['name'])
 	if player.team and player.team[0:10] == '__remove__':
 		player.print_team = None
 	else:
 		player.print_team = player.team
-	player.signup_at =  datetime.strptime(p['signed_up_at'], TS_FMT)
+	player.signup_at = parse_timestamp(p['signed_up_at'])
 	player.email = p['email']
 	player.role = None
 	for mb in p['organized_play_memberships']:
 	    if mb['network'] == network:
 	        player.number = mb['member_number']
+	        #ids are published in muster results, so only member numbers are used
+	        if player.number: player.id = player.number
 	        break
 	player.level = 0
 	player.roles = [] 
@@ -80,26 +98,128 @@ def list_of_players(lst, campaign):
 	if plst: plst.sort(key=lambda x:x.signup_at)
 	return plst
 
+def slot_table_groups(slot):
+	start_time = parse_timestamp(slot['starts_at'])
+	end_time = parse_timestamp(slot['ends_at'])
+	uuid = slot['uuid']
+	for session in slot['sessions']:
+		sc = session['scenario']
+		tg = TableGroup(sc['game_system'])
+		tg.start_time = start_time
+		tg.end_time = end_time
+		tg.uuid = [uuid,session['uuid']]
+		tg.id = session['uuid']
+		tg.event = sc['name']
+		tg.description = sc['blurb']
+		tg.pass_through['min_level'] = sc['min_level']
+		tg.pass_through['max_level'] = sc['max_level']
+		tg.tables = session['table_count']
+		tg.seats_per_table = session['table_size']
+		tg.gmlist = []
+		tg.gmlist = list_of_players(session['gms'], warhorn_campaign[sc['campaign']])
+		tg.players = list_of_players(session['players'], warhorn_campaign[sc['campaign']])
+		yield tg
+
 def warhorn2mustard(data):
+	'''Turn warhorn slots into TableGroups. data may be a list of slots, or any iterable
+	such as the generators below, in which case each slot is checked as it arrives.'''
+	if isinstance(data, list):
+		check_game_systems([session['scenario']['game_system'] for slot in data for session in slot['sessions']])
 	sessions = []
 	for slot in data:
-		start_time = datetime.strptime(slot['starts_at'], TS_FMT)
-		end_time = datetime.strptime(slot['ends_at'], TS_FMT)
-		uuid = slot['uuid']
-		for session in slot['sessions']:
-			sc = session['scenario']
-			tg = TableGroup(sc['game_system'])
-			tg.start_time = start_time
-			tg.end_time = end_time
-			tg.uuid = [uuid,session['uuid']]
-			tg.event = sc['name']
-			tg.description = sc['blurb']
-			tg.pass_through['min_level'] = sc['min_level']
-			tg.pass_through['max_level'] = sc['max_level']
-			tg.tables = session['table_count']
-			tg.seats_per_table = session['table_size']
-			tg.gmlist = []
-			tg.gmlist = list_of_players(session['gms'], warhorn_campaign[sc['campaign']])
-			tg.players = list_of_players(session['players'], warhorn_campaign[sc['campaign']])
-			sessions.append(tg)
-	return sessions
\ No newline at end of file
+		if not isinstance(data, list):
+			check_game_systems([session['scenario']['game_system'] for session in slot['sessions']])
+		sessions.extend(slot_table_groups(slot))
+	return sessions
+
+class JSONStream:
+	'''Incremental reader for a JSON document in a text file, decoding one value at a
+	time with the standard library decoder and reading more of the file as needed.'''
+	def __init__(self, fin, chunk_size=1 << 16):
+		self.fin = fin
+		self.chunk_size = chunk_size
+		self.decoder = json.JSONDecoder()
+		self.buf = ''
+		self.pos = 0
+		self.eof = False
+
+	def fill(self):
+		'''Read more of the file, at least doubling the unparsed buffer. False at EOF.'''
+		data = self.fin.read(max(self.chunk_size, len(self.buf) - self.pos))
+		if not data:
+			self.eof = True
+			return False
+		self.buf = self.buf[self.pos:] + data
+		self.pos = 0
+		return True
+
+	def peek(self):
+		'''The next character that is not whitespace, or an empty string at EOF.'''
+		while True:
+			while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\n\r':
+				self.pos += 1
+			if self.pos < len(self.buf) or not self.fill():
+				return self.buf[self.pos:self.pos + 1]
+
+	def expect(self, chars):
+		c = self.peek()
+		if not c or c not in chars:
+			raise json.JSONDecodeError('Expecting one of %s' % repr(chars), self.buf, self.pos)
+		self.pos += 1
+		return c
+
+	def value(self):
+		self.peek()
+		while True:
+			try:
+				(obj, end) = self.decoder.raw_decode(self.buf, self.pos)
+				#a number may continue past the end of the buffer
+				if end < len(self.buf) or self.eof:
+					self.pos = end
+					return obj
+			except json.JSONDecodeError:
+				if self.eof: raise
+			self.fill()
+
+def iter_slots(fin):
+	'''Yield the slots of a Warhorn event export one at a time, without loading the
+	whole file. Other top level fields are parsed and skipped.'''
+	stream = JSONStream(fin)
+	stream.expect('{')
+	if stream.peek() == '}': return
+	while True:
+		key = stream.value()
+		stream.expect(':')
+		if key != 'slots':
+			stream.value()
+		else:
+			stream.expect('[')
+			if stream.peek() == ']':
+				stream.expect(']')
+			else:
+				while True:
+					yield stream.value()
+					if stream.expect(',]') == ']': break
+		if stream.expect(',}') == '}': return
+
+def _spilled_slots(fspill):
+	fspill.seek(0)
+	for line in fspill:
+		yield json.loads(line)
+	fspill.close()
+
+def slots_by_venue(fin):
+	'''Yield (venue, slots) pairs for a Warhorn event export, in order of each venue's
+	first appearance. Slots are streamed from the file and spilled to a temporary file
+	per venue, so only one venue's slots are in memory at a time. Each venue's slots
+	are a generator, which must be used before moving on to the next venue.'''
+	with tempfile.TemporaryDirectory() as tmp:
+		spills = {}
+		for slot in iter_slots(fin):
+			venue = slot['venue']
+			if venue not in spills:
+				fname = os.path.join(tmp, '%d.jsonl' % len(spills))
+				spills[venue] = open(fname, 'w+', encoding='utf8')
+			spills[venue].write(json.dumps(slot) + '\n')
+		for venue in spills.keys():
+			yield (venue, _spilled_slots(spills[venue]))